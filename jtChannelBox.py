@@ -22,9 +22,21 @@
 
 import maya.cmds as cmds
 import maya.mel as mel
+import copy
+import hashlib
+import imp
+import os
+import sys
+import time
 from functools import partial
+from collections import OrderedDict
 import jtChannelBox_Commands_System as sysCmd
 
+try:
+    import cPickle as pickle
+except:
+    import pickle
+
 # reload(sysCmd)
 
 '''
@@ -64,7 +76,8 @@ class ChannelBox(object):
         # layout         : The layout that contains this channel box, eg. cmds.frameLayout()
         # menu_module     : String containing module name with menu variables, eg. "jtchannelBox_Menu_Default"
         # state_file      : String containing file name for saved states - Does not have to exist,
-        #                    eg. "jtchannelBox_State_Default" - Will be created alongside this script (same folder)
+        #                    eg. "jtchannelBox_State_Default" - Will be created in the local state folder (see STATE LOCATION
+        #                    in jtChannelBox_Commands_System)
         # saveState      : Boolean value whether to save the state to a file, if False you can specify state_file as ""
         # displayOptions : Array of 3 Boolean values for the following : [Show label on right click menu,
         #                    Hide unavailable items instead of disabling, Show Icons]
@@ -132,27 +145,36 @@ class ChannelBox(object):
         # CORE SYSTEM : Modify at own risk
         # ---------------------------------------------------------------#
         with sysCmd.Undo(0):  # prevents the creation of this UI being placed in the undo queue
-            try:
-                _menu = __import__(menu_module, globals(), locals(), [],
-                                   -1)  # __import__ used instead of import to allow module provided as string
-                reload(_menu)
-            except RuntimeError:
-                cmds.error("Menu failed to load. Files are missing or parameters are set incorrectly. Exiting.")
+            # menu module compiled into build plans, loaded once and shared by every channel box using it
+            _menu = channelbox_menu_module(menu_module)
+            self.menu_plans = _menu["plans"]
 
             self.state_file = state_file  # file containing menu states
             self.state_persist = persistent_state
-
-            self.menus = _menu.menus  # menu dict from given file
-            self.sym = _menu.symbol_commands  # dict containing commands for symbol buttons (icon bar)
-
-            self.saved_states = _menu.saved_states  # menu states from given file
-            self.menu_jobs = _menu.jobIDs  # script job IDs from given file
+            self.state_dirty = 0  # saved states changed since they were last written, see sysCmd.channelbox_save_state
+            self.state_flush_pending = 0
+            self.state_written = None  # each serialized state as last written to the state file, pickled
+            self.state_records = 0  # records in the state file since it was last compacted
+            self.sync_graph_pending = 0  # graph editor sync waiting on maya to be idle, see syncGraphEditor
+
+            self.menus = _menu["menus"]  # menu dict from given file
+            self.sym = _menu["symbol_commands"]  # dict containing commands for symbol buttons (icon bar)
+
+            # copied, the module isn't reloaded for each channel box so its own values must stay the defaults
+            self.saved_states = copy.deepcopy(_menu["saved_states"])  # menu states from given file
+            self.menu_jobs = dict(_menu["jobIDs"])  # script job IDs from given file
             self.filter = cmds.itemFilterAttr()  # filter created within class as with self so everything can access it
             self.filter_items = []  # all-accessible filtered pre-defined attributes
             self.filter_attrs = {}  # all-accessible filtered user-defined attributes
+            self.filter_nodes = OrderedDict()  # itemFilterAttr nodes by definition, oldest used first, for reuse
+            self.filter_nodes[("default", 0)] = self.filter  # cached with the rest so it's cleaned up with them
+            self.selection = None  # snapshot of the channel box selection, see sysCmd.Selection
+            self.menu_built = {}  # menuItems of each menu as last built, see channelbox_menu_rebuild
+            self.object_connection = None  # selectionConnection showing an object picked from the Objects menu
+            self.object_main_connection = None  # the channel box's own connection, restored by channelbox_object_follow
 
             # copy the default state of anything to be serialized for resetting later if user wants
-            self.menu_default_states = {k: v for k, v in _menu.saved_states.iteritems() if v[1] == 1}
+            self.menu_default_states = {k: copy.deepcopy(v) for k, v in _menu["saved_states"].iteritems() if v[1] == 1}
             self.symbols = {}  # saved symbolButton elements for accessing later.
 
             # Layouts
@@ -172,6 +194,22 @@ class ChannelBox(object):
                                 (self.channelbox, "top", 0, self.menubar_layout)]
                             )
 
+            # drop the selection snapshot whenever what's selected in the channel box could have changed
+            for event in ["ChannelBoxLabelSelected", "SelectionChanged"]:
+                cmds.scriptJob(event=(event, partial(sysCmd.channelbox_selection_invalidate, self)),
+                               parent=self.channelbox)
+
+            # forget the reusable filter nodes whenever the scene changes, they don't carry over to the new one
+            for event in ["SceneOpened", "NewSceneOpened"]:
+                cmds.scriptJob(event=(event, partial(sysCmd.channelbox_filter_nodes_clear, self)),
+                               parent=self.channelbox)
+
+            # write any saved state that's still waiting on maya to be idle when this closes or maya exits, and delete
+            #  this channel box's filter nodes when it closes, eg. when switching menu sets
+            cmds.scriptJob(uiDeleted=(self.channelbox, partial(sysCmd.channelbox_close, self)), runOnce=1)
+            cmds.scriptJob(event=("quitApplication", partial(sysCmd.channelbox_flush_state, self)),
+                           parent=self.channelbox)
+
             # Initialize
             self.re_init = init_setup  # For resetting attributes via menu. note: storing the function itself, not a result
             init_setup(self)
@@ -192,10 +230,10 @@ def channelbox_setup(box, pop_menu, pop_ctrl_modifier, *args):
     # behaviour you can add them here for your menus by adding conditionals on the
     # 'name' variable during the for loop on box.menus
     # -----------------------------------------------------------------------------------#
-    for name, menuItems in box.menus.iteritems():
+    for name in box.menus:
         if not name == "Objects":  # object menu is unique and based on list of selected objects, need custom creation
             menu = cmds.menu(l=name, p=box.menubar_layout)  # create the menu
-            cmds.menu(menu, e=1, pmc=partial(channelbox_menu_rebuild, box, menu, menuItems,
+            cmds.menu(menu, e=1, pmc=partial(channelbox_menu_rebuild, box, menu, box.menu_plans[name],
                                              False))  # add the command to rebuild the menu when opened
         else:  # object menu creation
             menu_object = cmds.menu(l="Objects", p=box.menubar_layout)
@@ -203,12 +241,12 @@ def channelbox_setup(box, pop_menu, pop_ctrl_modifier, *args):
 
     # right click / popup menu creation (different commands are used for a popup)
     menu_pop = cmds.popupMenu(b=3, allowOptionBoxes=1, p=box.channelbox)
-    cmds.popupMenu(menu_pop, e=1, pmc=partial(channelbox_menu_rebuild, box, menu_pop, box.menus[pop_menu], True))
+    cmds.popupMenu(menu_pop, e=1, pmc=partial(channelbox_menu_rebuild, box, menu_pop, box.menu_plans[pop_menu], True))
 
     menu_pop = cmds.popupMenu(b=3, ctrlModifier=1, allowOptionBoxes=1,
                               p=box.channelbox)  # right click menu for user holding ctrl when right clicking
     cmds.popupMenu(menu_pop, e=1,
-                   pmc=partial(channelbox_menu_rebuild, box, menu_pop, box.menus[pop_ctrl_modifier], True))
+                   pmc=partial(channelbox_menu_rebuild, box, menu_pop, box.menu_plans[pop_ctrl_modifier], True))
 
 
 # used to check if attributes are selected for menu items specified as disabled when none selected
@@ -219,7 +257,7 @@ def channelbox_menu_states(box, item_key, *args):
     # custom menu item with different conditions for being enabled you can do it
     # here by returning prior to the 'return result' on the final line
     #
-    # For this to function the "_hasEnableConditions" must be set to true/1
+    # For this to function the "has_enable_conditions" must be set to true/1
     # -----------------------------------------------------------------------------------#
 
     # ---------------- MANUALLY ADDED CONDITIONS ----------------#
@@ -250,6 +288,8 @@ def channelbox_menu_states(box, item_key, *args):
 # ----------------------------------------------------------------------------------- #
 # CUSTOM MENU TYPES : Anything set as a "custom" type in the menu can have it's
 # behaviour set here by checking for it's unique key
+# Return the menuItem created so later opens can enable or disable it without building the menu again,
+#   returning None builds the whole menu again every time it's opened
 # ----------------------------------------------------------------------------------- #
 def channelbox_menu_custom(box, item_key, item_type, label, command, parent, enabled):
     if item_key == "selectFilterSet":
@@ -259,6 +299,13 @@ def channelbox_menu_custom(box, item_key, item_type, label, command, parent, ena
             item_ob = cmds.menuItem(l=f, ob=1, p=m_item)
             cmds.menuItem(item, e=1, c=sysCmd.rpartial(command, box, item, item_key))
             cmds.menuItem(item_ob, e=1, c=sysCmd.rpartial(command, box, item_ob, item_key))
+        return m_item
+
+
+# the contents of a custom item, the menu is built again when this changes from the last time it was opened
+def channelbox_menu_custom_state(box, item_key):
+    if item_key == "selectFilterSet":
+        return tuple(box.saved_states["savedFilters"][0])
 
 
 # ----------------------------------------------------------------------------------- #
@@ -266,17 +313,59 @@ def channelbox_menu_custom(box, item_key, item_type, label, command, parent, ena
 # ----------------------------------------------------------------------------------- #
 # CUSTOM MENU "Objects" : Use this also as an example for implementing a custom menu
 # ----------------------------------------------------------------------------------- #
-def channelbox_command_objectmenu(box, menu, menu_item, m_item, *args):
-    state = cmds.menuItem(menu_item, q=1, isOptionBox=1)
-    item = cmds.menuItem(menu_item if not state else m_item, q=1, l=1)
+def channelbox_command_objectmenu(box, obj, option_box, *args):
+    if box.saved_states.get("objectsShowOnly", [0])[0]:
+        channelbox_object_show(box, obj)
+        if option_box:
+            mel.eval("showEditor \"" + obj + "\"")
+        return
 
-    cmds.select(item, deselect=1)
-    cmds.select(item, add=1)
+    # make it the lead object by moving it to the end of the selection, one selection change instead of two
+    sel = cmds.ls(os=1) or []
+    if not sel or sel[-1] != obj:
+        cmds.select([i for i in sel if i != obj] + [obj], replace=1, noExpand=1)
 
-    if state:
+    if option_box:
         mel.eval("editSelected")
 
 
+def channelbox_command_objectsShowOnly(box, menuItem, key, *args):
+    box.saved_states[key][0] = cmds.menuItem(menuItem, q=1, checkBox=1)
+    if not box.saved_states[key][0]:
+        channelbox_object_follow(box)
+    sysCmd.channelbox_save_state(box)
+
+
+def channelbox_object_show(box, obj):  # show obj in the channel box without changing the selection, until it changes
+    if box.object_connection is None:
+        box.object_main_connection = cmds.channelBox(box.channelbox, q=1, mainListConnection=1)
+        box.object_connection = cmds.selectionConnection(p=box.channelbox)
+    cmds.selectionConnection(box.object_connection, e=1, clear=1)
+    cmds.selectionConnection(box.object_connection, e=1, select=obj)
+    cmds.channelBox(box.channelbox, e=1, mainListConnection=box.object_connection)
+    sysCmd.channelbox_selection_invalidate(box)
+
+    job = box.menu_jobs.get("objectsShowOnly", -1)
+    if job == -1 or not cmds.scriptJob(exists=job):
+        box.menu_jobs["objectsShowOnly"] = cmds.scriptJob(event=("SelectionChanged",
+                                                                 partial(channelbox_object_follow, box)),
+                                                          runOnce=1, parent=box.channelbox)
+
+
+def channelbox_object_follow(box, *args):  # back to showing the selection after channelbox_object_show
+    if box.object_connection is None:
+        return
+
+    cmds.channelBox(box.channelbox, e=1, mainListConnection=box.object_main_connection)
+    sysCmd.channelbox_selection_invalidate(box)
+
+
+# OBJECTS MENU LIMIT : most objects listed directly in the Objects menu, the rest of the selection is put in
+#   submenus by namespace, or by node type if they share one, that are only filled in when opened. Groups holding
+#   more than this are split into pages, so no menu or submenu ever has many more items than this
+objects_menu_limit = 30
+
+
 def channelbox_menu_object(box, menu, *args):
     cmds.menu(menu, e=1, deleteAllItems=1)
 
@@ -284,21 +373,69 @@ def channelbox_menu_object(box, menu, *args):
 
     if not sel:
         cmds.menuItem(l="Nothing selected", p=menu)
+    else:
+        sel.reverse()
+        channelbox_menu_object_item(box, menu, sel[0])
+        cmds.menuItem(divider=1, p=menu)
+        channelbox_menu_object_items(box, menu, sel[1:objects_menu_limit])
+        channelbox_menu_object_groups(box, menu, sel[objects_menu_limit:])
+
+    if "objectsShowOnly" in box.saved_states:
+        cmds.menuItem(divider=1, p=menu)
+        label = "Show Without Selecting"
+        m_item = cmds.menuItem(l=label, cb=box.saved_states["objectsShowOnly"][0], p=menu,
+                               annotation="Show the chosen object in the channel box and leave the selection as is")
+        cmds.menuItem(m_item, e=1,
+                      c=sysCmd.rpartial(channelbox_command_objectsShowOnly, box, m_item, "objectsShowOnly", label))
+
+
+def channelbox_menu_object_groups(box, menu, rest):  # the selection past the limit, in submenus
+    if not rest:
+        return
+
+    cmds.menuItem(divider=1, p=menu)
+    groups = OrderedDict()  # group label : objects, in selection order
+    for obj in rest:
+        groups.setdefault(obj.rpartition("|")[2].rpartition(":")[0] or ":", []).append(obj)
+    if len(groups) == 1:  # one namespace, use node types instead, found in a single query
+        groups = OrderedDict()
+        listed = cmds.ls(rest, showType=1) or []
+        types = dict(zip(listed[::2], listed[1::2]))
+        for obj in rest:
+            groups.setdefault(types.get(obj, "unknown"), []).append(obj)
+    if len(groups) == 1 or len(groups) > objects_menu_limit:  # grouping doesn't help, just use pages
+        groups = OrderedDict([("More", rest)])
+
+    for label, objects in groups.iteritems():
+        channelbox_menu_object_submenu(box, menu, label + " (" + str(len(objects)) + ")", objects)
+
+
+def channelbox_menu_object_item(box, menu, obj):  # an object's item and option box
+    m_item = cmds.menuItem(l=obj, p=menu)
+    m_item_box = cmds.menuItem(m_item, optionBox=1, p=menu)
+    cmds.menuItem(m_item, e=1, c=sysCmd.rpartial(channelbox_command_objectmenu, box, obj, 0, "select " + obj))
+    cmds.menuItem(m_item_box, e=1, c=sysCmd.rpartial(channelbox_command_objectmenu, box, obj, 1,
+                                                     "select " + obj + " [  ]"))
+
+
+def channelbox_menu_object_items(box, menu, objects, *args):  # list objects, in pages if there's too many
+    if len(objects) <= objects_menu_limit:
+        for obj in objects:
+            channelbox_menu_object_item(box, menu, obj)
         return
 
-    sel.reverse()
-    first = 1
+    size = objects_menu_limit  # pages of pages when there's more than the limit of pages
+    while len(objects) > size * objects_menu_limit:
+        size *= objects_menu_limit
+    for i in range(0, len(objects), size):
+        page = objects[i:i + size]
+        channelbox_menu_object_submenu(box, menu, str(i + 1) + " - " + str(i + len(page)), page)
 
-    for i in sel:
-        m_item = cmds.menuItem(l=i, p=menu)
-        m_item_box = cmds.menuItem(m_item, optionBox=1, p=menu)
-        cmds.menuItem(m_item, e=1, c=sysCmd.rpartial(channelbox_command_objectmenu, box, menu, m_item, "select " + i))
-        cmds.menuItem(m_item_box, e=1, c=sysCmd.rpartial(channelbox_command_objectmenu, box, menu, m_item_box, m_item,
-                                                         "select " + i + " [  ]"))
 
-        if first:
-            cmds.menuItem(divider=1, p=menu)
-            first = 0
+def channelbox_menu_object_submenu(box, menu, label, objects):  # submenu filled in the first time it's opened
+    m_item = cmds.menuItem(l=label, subMenu=1, p=menu)
+    cmds.menuItem(m_item, e=1, postMenuCommandOnce=1,
+                  postMenuCommand=partial(channelbox_menu_object_items, box, m_item, objects))
 
 
 # -----------------------------------------------------------------------------------#
@@ -364,139 +501,515 @@ def channelbox_symbols(box, *args):
 # that they could benefit everyone
 # --------------------------------------------------------------------------------------
 
-def channelbox_menu_rebuild(box, menu, menu_items, popup, *args):  # build the menu when a menu is opened
-    def menu_counter(items):
-        if items[2] is not "":  # if a parent is set then this is an item of the given type
-            if items[1] >= items[0]:  # then we've completed the last item for the given type
-                items = [0, 0,
-                         ""]  # resets the array, clearing parent allows next menu item to know it's not a given type
+# MENU MODULES : each menu module is compiled once and kept with the modified times of the files it came from, it's
+#   only compiled again when one of them changes. The compiled menus are also written to the local state folder
+#   (see MENU CACHE), so a later session that finds the same source files uses them without running the module at all
+menu_modules = {}  # module name : [compiled menu module, {source file : modified time}]
+menu_commands = {}  # commands module name : file modified time when it was last loaded
+
+
+def channelbox_menu_file_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except (OSError, TypeError):  # gone, or no source to compare against
+        return None
+
+
+def channelbox_menu_module_file(module):  # the .py file a module was loaded from
+    return os.path.realpath(os.path.splitext(module.__file__)[0] + ".py") if getattr(module, "__file__", None) else None
+
+
+def channelbox_menu_import(name, message):  # import a module given as string
+    try:
+        # __import__ used instead of import to allow module provided as string
+        return __import__(name, globals(), locals(), ["__name__"], -1)
+    except (ImportError, RuntimeError):
+        cmds.error(message)
+
+
+def channelbox_menu_commands(name):  # import a commands module, reloaded if its file changed since it was loaded
+    loaded = name in sys.modules
+    module = channelbox_menu_import(name, "Commands module " + name + " failed to load. Exiting.")
+    mtime = channelbox_menu_file_mtime(channelbox_menu_module_file(module))
+    if loaded and menu_commands.get(name, -1) != mtime:
+        module = reload(module)
+    menu_commands[name] = mtime
+    return module
+
+
+def channelbox_menu_module(menu_module, _chain=()):  # returns the compiled menu module, see channelbox_menu_load
+    entry = menu_modules.get(menu_module)
+    if entry is not None and all(channelbox_menu_file_mtime(f) == t for f, t in entry[1].iteritems()):
+        return entry[0]
+
+    if menu_module in _chain:
+        cmds.error("Menu " + menu_module + " is its own base through " + " -> ".join(_chain) + ". Exiting.")
+
+    compiled = channelbox_menu_cache_read(menu_module)
+    if compiled is None:  # first use or its source changed, run the module
+        loaded = menu_module in sys.modules
+        module = channelbox_menu_import(menu_module, "Menu failed to load. Files are missing or parameters are set "
+                                                     "incorrectly. Exiting.")
+        if loaded:  # imported earlier, its file may have changed since
+            module = reload(module)
+        compiled = channelbox_menu_load(module, _chain + (menu_module,))
+        channelbox_menu_cache_write(menu_module, compiled)
+
+    commands = channelbox_menu_commands(compiled["commands"])
+    linked = channelbox_menu_link(menu_module, compiled, commands)
+    files = [path for name, path, digest in compiled["sources"]] + [channelbox_menu_module_file(commands)]
+    menu_modules[menu_module] = [linked, {f: channelbox_menu_file_mtime(f) for f in files}]
+    return linked
+
+
+def channelbox_menu_hot_reload(*args):  # developer use : reload every menu module and commands module on next use
+    menu_commands.clear()
+    menu_modules.clear()
+    for name in os.listdir(sysCmd.channelbox_get_state_path()):
+        if name.endswith(".menu"):
+            try:
+                os.remove(sysCmd.channelbox_get_state_path() + name)
+            except OSError:
+                pass
+
+
+# ----------------------------------------------------------------------------------- #
+# MENU CACHE : a compiled menu module pickled to <state folder>/<module name>.menu along with the name, path and
+#   sha1 of each source file it was compiled from (the module and its bases). It's used as long as each of those
+#   files can still be found and hashes the same, command functions are stored by name and looked up on load
+# ----------------------------------------------------------------------------------- #
+menu_cache_version = 1
+menu_cache_key = []  # (menu_cache_version, sha1 of this file), a change to how menus are compiled outdates the cache
+
+
+def channelbox_menu_cache_key():
+    if not menu_cache_key:
+        menu_cache_key.append((menu_cache_version, channelbox_menu_digest(channelbox_menu_module_file(sys.modules[
+            __name__]))))
+    return menu_cache_key[0]
+
+
+def channelbox_menu_source(name):  # path of a module's .py file, found without importing it, None if there isn't one
+    if name in sys.modules:
+        return channelbox_menu_module_file(sys.modules[name])
+
+    path = None
+    try:
+        for part in name.split("."):
+            _file, path, description = imp.find_module(part, [path] if path else None)
+            if _file:
+                _file.close()
+    except ImportError:
+        return None
+    return os.path.realpath(path) if path and description[2] == imp.PY_SOURCE else None
+
+
+def channelbox_menu_digest(path):
+    try:
+        with open(path, "rb") as _file:
+            return hashlib.sha1(_file.read()).hexdigest()
+    except (IOError, TypeError):
+        return None
+
+
+def channelbox_menu_cache_read(menu_module):  # the cached compiled menu module, or None if it's missing or outdated
+    try:
+        with open(sysCmd.channelbox_get_state_path() + menu_module + ".menu", "rb") as _file:
+            cached = pickle.load(_file)
+        if cached["version"] != channelbox_menu_cache_key():
+            return None
+        for name, path, digest in cached["compiled"]["sources"]:
+            if channelbox_menu_source(name) != path or channelbox_menu_digest(path) != digest:
+                return None
+        return cached["compiled"]
+    except Exception:  # missing, unreadable or written by something else, compile instead
+        return None
+
+
+def channelbox_menu_cache_write(menu_module, compiled):
+    if None in [digest for name, path, digest in compiled["sources"]]:
+        return  # a source that can't be hashed can't be checked next time
+
+    path = sysCmd.channelbox_get_state_path() + menu_module + ".menu"
+    try:
+        with open(path + ".tmp", "wb") as _file:
+            pickle.dump({"version": channelbox_menu_cache_key(), "compiled": compiled}, _file, pickle.HIGHEST_PROTOCOL)
+        sysCmd.channelbox_replace_file(path + ".tmp", path)
+    except (IOError, OSError, pickle.PicklingError):  # only a cache, next session compiles again
+        pass
+
+
+def channelbox_menu_benchmark(menu_module="jtChannelBox_Menu_Default", runs=20, *args):
+    # developer use : compare loading a menu module by running and compiling it, from the menu cache, and from memory
+    def run(load):
+        start = time.time()
+        for i in range(runs):
+            load()
+        return (time.time() - start) / runs * 1000.0
+
+    def compile_module():
+        module = reload(channelbox_menu_import(menu_module, "Menu " + menu_module + " failed to load."))
+        compiled = channelbox_menu_load(module, (menu_module,))
+        channelbox_menu_link(menu_module, compiled, channelbox_menu_commands(compiled["commands"]))
+
+    def cached_module():
+        compiled = channelbox_menu_cache_read(menu_module)
+        channelbox_menu_link(menu_module, compiled, channelbox_menu_commands(compiled["commands"]))
+
+    channelbox_menu_module(menu_module)  # make sure it's compiled and cached
+    if channelbox_menu_cache_read(menu_module) is None:
+        cmds.error("Menu " + menu_module + " can't be cached, its source files weren't found.")
+
+    results = [run(compile_module), run(cached_module), run(lambda: channelbox_menu_module(menu_module))]
+    print "// Result: " + menu_module + " - compiled : %.3f ms, cached : %.3f ms, in memory : %.3f ms //" % tuple(
+        results)
+    return results
+
+
+# ----------------------------------------------------------------------------------- #
+# MENU SPEC : menus in a menu module are read into nodes, checked, then compiled into plans once per module load,
+#   see MENU FORMAT in jtChannelBox_Menu_Default for how they're written
+# NODE : [key, label, selected_only, type, command name, tooltip, children]
+#   children : list of nodes of a "submenu" or "radio", None for anything else, a divider is a node of type "divider"
+# ----------------------------------------------------------------------------------- #
+menu_item_types = ["", "checkbox", "optionbox", "submenu", "radio", "custom"]
+
+
+def channelbox_menu_load(module, chain):  # compile a menu module on top of its base
+    # COMPILED : {"sources": [(module name, .py file, sha1), ...] for the module and each of its bases,
+    #             "commands": commands module name, "menus": {menu name : nodes, or "" for a custom menu},
+    #             "plans": {menu name : plan}, "symbol_commands": {name : command name}, "saved_states": {},
+    #             "jobIDs": {}}
+    # only names are kept so it can be pickled, see channelbox_menu_link for the version a channel box uses
+    name = module.__name__
+    base = getattr(module, "menu_base", "")
+    base = channelbox_menu_module(base, chain) if base else None
+    commands = getattr(module, "commands", "") or (base["commands"] if base else "")
+    if not commands:
+        cmds.error("Menu " + name + " has no commands module or menu base. Exiting.")
+    commands = channelbox_menu_commands(commands)
+
+    menus = copy.deepcopy(base["menus"]) if base else OrderedDict()  # edited in place, the base's must stay as is
+    for menu, items in getattr(module, "menus", {}).iteritems():
+        menus[menu] = channelbox_menu_spec_parse(name, menu, items, None) if items != "" else ""
+    for menu, edits in getattr(module, "menu_edits", {}).iteritems():
+        if not isinstance(menus.get(menu), list):
+            channelbox_menu_spec_error(name, menu, "there's no menu by this name in the base to edit")
+        channelbox_menu_spec_edit(name, menu, menus[menu], edits)
+
+    symbol_commands = dict(base["symbol_names"]) if base else {}
+    symbol_commands.update(getattr(module, "symbol_commands", {}))
+    saved_states = copy.deepcopy(base["saved_states"]) if base else {}
+    saved_states.update(copy.deepcopy(getattr(module, "saved_states", {})))
+    job_ids = dict(base["jobIDs"]) if base else {}
+    job_ids.update(getattr(module, "jobIDs", {}))
+
+    plans = {}
+    for menu, nodes in menus.iteritems():
+        if nodes != "":
+            channelbox_menu_spec_check(name, menu, nodes, commands)
+            plans[menu] = channelbox_menu_compile(menu, nodes)
+
+    path = channelbox_menu_module_file(module)
+    sources = (base["sources"] if base else []) + [(name, path, channelbox_menu_digest(path))]
+    return {"sources": sources, "commands": commands.__name__, "menus": menus, "plans": plans,
+            "symbol_commands": symbol_commands, "saved_states": saved_states, "jobIDs": job_ids}
+
+
+def channelbox_menu_link(menu_module, compiled, commands):  # compiled menu module with command names made functions
+    # LINKED : as COMPILED, but "plans" and "symbol_commands" hold the functions, "symbol_names" the names
+    def command(menu, name):
+        function = channelbox_menu_command(commands, name)
+        if function is None:
+            channelbox_menu_spec_error(menu_module, menu, "unknown command '" + name + "' in " + commands.__name__)
+        return function
+
+    linked = dict(compiled)
+    linked["plans"] = {}
+    for menu, plan in compiled["plans"].iteritems():
+        items = [item[:4] + (command(menu, item[4]) if item[4] else "",) + item[5:] for item in plan["items"]]
+        linked["plans"][menu] = {"label": plan["label"], "items": items}
+    linked["symbol_names"] = compiled["symbol_commands"]
+    linked["symbol_commands"] = {k: command("symbol_commands", v) for k, v in compiled["symbol_commands"].iteritems()}
+    return linked
+
+
+def channelbox_menu_spec_error(module, menu, message):
+    cmds.error("Menu " + module + ", " + menu + " : " + message)
+
+
+def channelbox_menu_command(commands, name):  # command function from its name, the channelbox_command_ prefix optional
+    return getattr(commands, "channelbox_command_" + name, None) or getattr(commands, name, None)
+
+
+def channelbox_menu_spec_parse(module, menu, items, nodes):  # read a list of items into nodes
+    # nodes : the menu being edited, a string item other than a divider is the key of an item in it to move
+    result = []
+    for item in items:
+        if item == "-":
+            result.append(["", "", 0, "divider", "", "", None])
+            continue
+
+        if isinstance(item, basestring):
+            node = channelbox_menu_spec_take(nodes, item) if nodes is not None else None
+            if node is None:
+                channelbox_menu_spec_error(module, menu, "no item with key '" + item + "'")
+            result.append(node)
+            continue
+
+        if not isinstance(item, (tuple, list)) or not 4 <= len(item) <= 6:
+            channelbox_menu_spec_error(module, menu, repr(item) + " should be (label, has_enable_conditions, type, "
+                                                                  "command, tooltip, key) or \"-\"")
+
+        label, selected_only, item_type, command = item[:4]
+        tooltip = item[4] if len(item) > 4 else ""
+        key = item[5] if len(item) > 5 else ""
+        children = None
+
+        if item_type not in menu_item_types:
+            channelbox_menu_spec_error(module, menu, label + " : unknown type '" + str(item_type) + "'")
+        if item_type in ["checkbox", "radio", "custom"] and not key:
+            channelbox_menu_spec_error(module, menu, (label or repr(item)) + " : a " + item_type + " needs a key")
+
+        if item_type in ["submenu", "radio"]:
+            if not isinstance(command, (tuple, list)):
+                channelbox_menu_spec_error(module, menu, label + " : a " + item_type + " takes a list of its items "
+                                                                 "in place of a command")
+            children = channelbox_menu_spec_parse(module, menu, command, nodes)
+            command = ""
+        elif not isinstance(command, basestring):
+            channelbox_menu_spec_error(module, menu, label + " : command should be the name of a command")
+
+        result.append([key or command or label, label, selected_only, item_type, command, tooltip, children])
+    return result
+
+
+def channelbox_menu_spec_find(nodes, key):  # (list containing the node, its index) or None, searches submenus too
+    for index, node in enumerate(nodes):
+        if node[0] == key and node[3] != "divider":
+            return nodes, index
+        if node[6] is not None:
+            found = channelbox_menu_spec_find(node[6], key)
+            if found is not None:
+                return found
+    return None
+
+
+def channelbox_menu_spec_take(nodes, key):  # remove the node with this key and return it, or None if there isn't one
+    found = channelbox_menu_spec_find(nodes, key)
+    return found[0].pop(found[1]) if found is not None else None
+
+
+def channelbox_menu_spec_edit(module, menu, nodes, edits):  # apply a list of edits to a menu's nodes in place
+    for edit in edits:
+        op = edit[0] if isinstance(edit, (tuple, list)) and edit else None
+
+        if op == "remove":
+            for key in edit[1:]:
+                if channelbox_menu_spec_take(nodes, key) is None:
+                    channelbox_menu_spec_error(module, menu, "nothing to remove with key '" + key + "'")
+        elif op == "append":
+            nodes.extend(channelbox_menu_spec_parse(module, menu, edit[1:], nodes))
+        elif op in ["before", "after"] and len(edit) >= 3:
+            items = channelbox_menu_spec_parse(module, menu, edit[2:], nodes)  # moved items are taken out first
+            found = channelbox_menu_spec_find(nodes, edit[1])
+            if found is None:
+                channelbox_menu_spec_error(module, menu, "no item with key '" + edit[1] + "' to place items " + op)
+            index = found[1] + 1 if op == "after" else found[1]
+            found[0][index:index] = items
+        else:
+            channelbox_menu_spec_error(module, menu, repr(edit) + " should start with \"remove\", \"before\", "
+                                                                  "\"after\" or \"append\"")
+
+
+def channelbox_menu_spec_check(module, menu, nodes, commands, keys=None, in_radio=0):  # validate a finished menu
+    keys = set() if keys is None else keys
+    for key, label, selected_only, item_type, command, tooltip, children in nodes:
+        if item_type == "divider":
+            if in_radio:
+                channelbox_menu_spec_error(module, menu, "a radio collection can't contain a divider")
+            continue
+        if key in keys:
+            channelbox_menu_spec_error(module, menu, "key '" + key + "' is used more than once, give one of the "
+                                                                     "items its own key")
+        keys.add(key)
+
+        if in_radio and item_type != "":
+            channelbox_menu_spec_error(module, menu, label + " : a radio collection can only contain plain items")
+        if command and channelbox_menu_command(commands, command) is None:
+            channelbox_menu_spec_error(module, menu, label + " : unknown command '" + command + "' in " +
+                                       commands.__name__)
+        if children is not None:
+            if not children:
+                channelbox_menu_spec_error(module, menu, (label or key) + " : a " + item_type + " needs items")
+            channelbox_menu_spec_check(module, menu, children, commands, keys, item_type == "radio")
+
+
+def channelbox_menu_compile(name, nodes):  # flatten a menu's nodes into a build plan, done once per module
+    # PLAN : {"label": menu name, "items": [entry, ...]}
+    # each entry is a tuple of :
+    # (key, label, selected_only, kind, command, tooltip, parent, radio_index, radio_total, radio_key, cmd_label)
+    #   kind        : "divider", "custom", "radio", "checkbox", "submenu", "radioItem", "optionbox" or "item"
+    #   parent      : index of the entry whose menuItem is the parent, -1 for the menu itself
+    #   radio_index : position of a "radioItem" within its collection, radio_total the collection's item count
+    #   cmd_label   : the Undo/Redo output string for commands, prefixed with "> " inside submenus
+    #   command is the command's name, or "" for none
+    plan = []
+
+    def add(nodes, parent, prefix):
+        last = "divider"  # no divider at the start of a menu or submenu, nor two in a row
+        for key, label, selected_only, item_type, command, tooltip, children in nodes:
+            if item_type == "divider":
+                if last != "divider":
+                    plan.append(("divider_" + str(len(plan)), "", 0, "divider", "", "", parent, 0, 0, "", ""))
+                    last = item_type
+                continue
+
+            index = len(plan)
+            if item_type == "custom":
+                plan.append((key, label, selected_only, "custom", command, tooltip, parent, 0, 0, "", label))
+            elif item_type == "radio":
+                plan.append((key, label, selected_only, "radio", command, tooltip, parent, 0, 0, "", label))
+                for radio_index, child in enumerate(children):
+                    # radio items go in the menu or submenu, the collection only groups them
+                    plan.append((child[0], child[1], child[2], "radioItem", child[4], child[5],
+                                 parent if parent != -1 else index, radio_index, len(children), key,
+                                 prefix + child[1]))
+            elif item_type == "submenu":
+                plan.append((key, label, selected_only, "submenu", command, tooltip, parent, 0, 0, "", prefix + label))
+                add(children, index, "> ")
             else:
-                items[1] += 1  # counter for remaining amount of items
-        return items
+                plan.append((key, label, selected_only, item_type or "item", command, tooltip, parent, 0, 0, "",
+                             prefix + label))
+            last = item_type
+
+        if last == "divider" and plan and plan[-1][3] == "divider" and plan[-1][6] == parent:
+            plan.pop()  # nothing followed it
+
+    add(nodes, -1, "")
+    return {"label": name, "items": plan}
+
+
+def channelbox_menu_rebuild(box, menu, plan, popup, *args):  # update or build the menu when a menu is opened
+    # the menuItems are only created the first time, later opens edit the enabled, checkbox and radio button states
+    #   that changed. The menu is built again when what's shown changes : the plan, the popup label, a custom item's
+    #   contents or, with unavailable items hidden, which items are available
+    sysCmd.channelbox_selection_invalidate(box)  # take a fresh snapshot for this open, shared by every enable check
+    hide_unavailable = box.saved_states["hideUnavailable"][0]
+    items = plan["items"]
+
+    enabled = [channelbox_menu_states(box, entry[0], entry[0]) if entry[2] else 1 for entry in items]
+    layout = (popup and box.saved_states["popupLabel"][0], tuple(enabled) if hide_unavailable else None,
+              tuple([channelbox_menu_custom_state(box, entry[0]) for entry in items if entry[3] == "custom"]))
+
+    built = box.menu_built.get(menu)
+    if built is None or built["plan"] is not plan or built["layout"] != layout:
+        created = channelbox_menu_build(box, menu, plan, popup, enabled, hide_unavailable)
+        if created is None:
+            box.menu_built.pop(menu, None)
+        else:
+            box.menu_built[menu] = {"plan": plan, "layout": layout, "items": created, "enabled": enabled}
+        return
 
-    cmds.menu(menu, e=1, deleteAllItems=1) if popup else cmds.popupMenu(menu, e=1, deleteAllItems=1)
+    for index, m_item in enumerate(built["items"]):
+        kind = items[index][3]
+        if m_item is None or kind == "radio":  # hidden, or nothing that can be edited
+            continue
+        if enabled[index] != built["enabled"][index]:
+            cmds.menuItem(m_item, e=1, en=enabled[index])
+        if kind == "checkbox":  # compared with the menuItem itself, clicking it changes it without an edit
+            state = channelbox_menu_item_state(box, items[index])
+            if bool(cmds.menuItem(m_item, q=1, cb=1)) != bool(state):
+                cmds.menuItem(m_item, e=1, cb=state)
+        elif kind == "radioItem":
+            state = channelbox_menu_item_state(box, items[index])
+            if bool(cmds.menuItem(m_item, q=1, radioButton=1)) != bool(state):
+                cmds.menuItem(m_item, e=1, radioButton=state)
+    built["enabled"] = enabled
+
+
+def channelbox_menu_item_state(box, entry):  # whether a checkbox or radio button entry is checked
+    key, kind, radio_index, radio_total, radio_key = entry[0], entry[3], entry[7], entry[8], entry[9]
+    if kind == "checkbox":
+        return box.saved_states[key][0] if key in box.saved_states else 0
+
+    if radio_key in box.saved_states:
+        if radio_total >= 2:
+            return radio_index == box.saved_states[radio_key][0] - 1
+        else:
+            return 0 if box.saved_states[radio_key][0] - 1 == radio_index else 1
+            # can't use division on a 0, nor do we need to shift the range for 2 numbers
+    return 1 if radio_index == 0 else 0  # no setting, assume the first item is selected by default
 
-    # initialize required variables
-    sub = [0, 0, ""]  # [total submenu items, remaining, submenu parent]
-    radio = [0, 0, "", ""]  # [total radio items, remaining, radio parent, radio key]
-    radio_key = ""
-    last_added_type = ""  #
+
+def channelbox_menu_build(box, menu, plan, popup, enabled, hide_unavailable):
+    # create every menuItem of the menu, returns what was created for each plan entry (None if skipped or a
+    #   divider), or None if a custom item can't be updated and the menu has to be built on every open
+    cmds.menu(menu, e=1, deleteAllItems=1) if popup else cmds.popupMenu(menu, e=1, deleteAllItems=1)
 
     if box.saved_states["popupLabel"][0] and popup:  # draw title label on popup menu if desired
-        # print [key for key, menu in box.menus.iteritems() if menu == menu_items]
-        # print menu
-        cmds.menuItem(l=[key for key, value in box.menus.iteritems() if value == menu_items][0],
-                      p=menu)  # Gets the label from the menu key in box.menus by looping through the dict
-        # for menu_items identical to the given one
+        cmds.menuItem(l=plan["label"], p=menu)
         cmds.menuItem(divider=1, p=menu)
 
-    for key, values in menu_items.iteritems():
-        label = values[0]  # display name
-        selected_only = values[1]  # only enable if attributes are selected
-        item_type = values[2]  # eg default, checkbox, submenu, radio button
-        command = values[3]  # function used as command
-        tooltip = "" if not len(values) == 5 else values[4]
-
-        enabled = 1  # should enable or disable?
-        no_edit = 0  # should add partial command?
-        parent = menu  # compensate for adding submenu items to correct parent
-
-        if sub[2] != "":  # submenu counter is active, this item is in a submenu
-            parent = sub[2]
-        elif radio[2] != "":  # radio counter is active, this item is in a radio collection
-            parent = radio[2]
-
-        if selected_only:  # check if this only gets enabled when an attribute is selected
-            enabled = channelbox_menu_states(box, key, key)  # check if attribute is selected
-            if not enabled and box.saved_states["hideUnavailable"][
-                0]:  # if chosen not to display unavailable attributes nothing more needs doing, move on
-                continue
+    created = [None] * len(plan["items"])  # menuItems created for each plan entry, None if skipped
+    last_added_type = ""
+    keep = 1
 
-        if item_type == "divider":
-            if last_added_type != "divider":  # prevent stacking dividers when disabled options are hidden
-                cmds.menuItem(divider=1, p=parent)
-                last_added_type = item_type
-            continue
+    for index, entry in enumerate(plan["items"]):
+        key, label, selected_only, kind, command, tooltip, parent, radio_index, radio_total, radio_key, \
+            cmd_label = entry
+        if parent == -1:
+            parent = menu
+        else:
+            parent = created[parent]
+            if parent is None:  # the submenu or radio collection this belongs to was hidden
+                continue
 
-        if item_type == "custom":
-            channelbox_menu_custom(box, key, item_type, label, command, parent, enabled)
-            last_added_type = item_type
+        if not enabled[index] and hide_unavailable:
+            # if chosen not to display unavailable attributes nothing more needs doing, move on
             continue
 
-        if "radio" in item_type:
-            radio[0] = values[3]  # how many following items are put in radio collection
-            radio[1] = 0
-            m_item = cmds.radioMenuItemCollection(p=parent)
-            radio[2] = m_item
-            radio_key = key
-            last_added_type = item_type
+        if kind == "divider":
+            if last_added_type != "divider":  # prevent stacking dividers when disabled options are hidden
+                cmds.menuItem(divider=1, p=parent)
+                last_added_type = kind
             continue
 
-        if "checkbox" in item_type:
-            m_item = cmds.menuItem(l=label, en=enabled, cb=box.saved_states[key][0] if key in box.saved_states else 0,
+        if kind == "custom":
+            created[index] = channelbox_menu_custom(box, key, kind, label, command, parent, enabled[index])
+            if created[index] is None:
+                keep = 0
+        elif kind == "radio":
+            created[index] = cmds.radioMenuItemCollection(p=parent)
+        elif kind == "checkbox":
+            m_item = cmds.menuItem(l=label, en=enabled[index], cb=channelbox_menu_item_state(box, entry),
                                    annotation=tooltip, p=parent)
             if command != "":
                 cmds.menuItem(m_item, e=1, c=sysCmd.rpartial(command, box, m_item, key, label))
-            no_edit = 1
-        elif "submenu" in item_type:
-            sub[0] = values[3]  # how many following items are put in submenu
-            sub[1] = 0
-            m_item = cmds.menuItem(l=label, en=enabled, subMenu=1, p=parent)
-            sub[2] = m_item  # set the parent for the submenus created after this
-            no_edit = 1
-        elif radio[2] is not "":  # radio counter is active
-            if radio_key in box.saved_states:
-                if radio[0] >= 2:
-                    which_radio = radio[1] == box.saved_states[radio_key][0] - 1
-                else:
-                    which_radio = 0 if box.saved_states[radio_key][0] - 1 == radio[
-                        1] else 1  # can't use division on a 0, nor do we need to shift the range for 2 numbers
-            else:
-                which_radio = 1 if radio[1] == 0 else 0  # no setting, assume the first item is selected by default
-            m_item = cmds.menuItem(l=label, en=enabled, radioButton=which_radio, annotation=tooltip, p=parent)
+            created[index] = m_item
+        elif kind == "submenu":
+            created[index] = cmds.menuItem(l=label, en=enabled[index], subMenu=1, p=parent)
+        elif kind == "radioItem":
+            m_item = cmds.menuItem(l=label, en=enabled[index], radioButton=channelbox_menu_item_state(box, entry),
+                                   annotation=tooltip, p=parent)
             if command != "":
                 cmds.menuItem(m_item, e=1, c=partial(command, box, m_item, key))
-            no_edit = 1
+            created[index] = m_item
         else:
-            m_item = cmds.menuItem(l=label, en=enabled, annotation=tooltip, p=parent)
-            if item_type == "optionbox":
+            m_item = cmds.menuItem(l=label, en=enabled[index], annotation=tooltip, p=parent)
+            if kind == "optionbox":
                 m_item2 = cmds.menuItem(m_item, ob=1, p=parent)
                 if command != "":
                     cmds.menuItem(m_item2, e=1, c=sysCmd.rpartial(command, box, m_item2, key, label))
-
-        if not no_edit:
             if command != "":
-                cmds.menuItem(m_item, e=1, c=sysCmd.rpartial(command, box, m_item, key, label if sub[
-                    2] == "" else "> " + label))  # add command after declaration to provide itself as parameter
-
-        sub = menu_counter(sub)
-        radio = menu_counter(radio)
-        last_added_type = item_type
-
-
-def channelbox_menu_selected_channels(box):
-    obj_list = cmds.channelBox(box.channelbox, q=1, mainObjectList=1)
-    attr_list = cmds.channelBox(box.channelbox, q=1, selectedMainAttributes=1)
+                # add command after declaration to provide itself as parameter
+                cmds.menuItem(m_item, e=1, c=sysCmd.rpartial(command, box, m_item, key, cmd_label))
+            created[index] = m_item
 
-    if obj_list and attr_list and len(obj_list) > 0 and len(attr_list) > 0:
-        return 1
+        last_added_type = kind
 
-    obj_list = cmds.channelBox(box.channelbox, q=1, shapeObjectList=1)
-    attr_list = cmds.channelBox(box.channelbox, q=1, selectedShapeAttributes=1)
+    return created if keep else None
 
-    if obj_list and attr_list and len(obj_list) > 0 and len(attr_list) > 0:
-        return 1
 
-    obj_list = cmds.channelBox(box.channelbox, q=1, historyObjectList=1)
-    attr_list = cmds.channelBox(box.channelbox, q=1, selectedHistoryAttributes=1)
-
-    if obj_list and attr_list and len(obj_list) > 0 and len(attr_list) > 0:
-        return 1
-
-    obj_list = cmds.channelBox(box.channelbox, q=1, outputObjectList=1)
-    attr_list = cmds.channelBox(box.channelbox, q=1, selectedOutputAttributes=1)
-
-    if obj_list and attr_list and len(obj_list) > 0 and len(attr_list) > 0:
-        return 1
-
-    return 0
+def channelbox_menu_selected_channels(box):
+    return sysCmd.channelbox_selection(box).has_channels()
@@ -19,9 +19,15 @@
 
 import maya.cmds as cmds
 import maya.mel as mel
+import time
 from functools import partial
 import jtChannelBox_Commands_System as sysCmd
 
+try:
+    import maya.api.OpenMaya as om
+except ImportError:  # versions of maya without the 2.0 api fall back to cmds queries
+    om = None
+
 
 # reload(sysCmd)
 
@@ -42,52 +48,65 @@ import jtChannelBox_Commands_System as sysCmd
 # -------------- CHANNEL MENU -------------  
 # -----------------------------------------  
 def channelbox_command_keyItem(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        cmds.channelBox(box.channelbox, e=1,
-                        exe=("if( `getAttr -k \"#P.#A\"`||`getAttr -channelBox \"#P.#A\"` )setKeyframe \"#P.#A\";", 1))
+    channelBox_KeyPlugs(box, "setKeyframe", 1, ["keyable", "channelBox"])
 
 
 def channelbox_command_keyAll(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        cmds.channelBox(box.channelbox, e=1, exe=("if( `getAttr -k \"#P.#A\"` ) setKeyframe \"#P.#A\";", 0))
+    channelBox_KeyPlugs(box, "setKeyframe", 0, ["keyable"])
 
 
 def channelbox_command_breakdown(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        cmds.channelBox(box.channelbox, e=1, exe=("setKeyframe -breakdown true \"#P.#A\";", 1))
+    channelBox_KeyPlugs(box, "setKeyframe", 1, breakdown=1)
 
 
 def channelbox_command_breakdownAll(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        cmds.channelBox(box.channelbox, e=1, exe=("setKeyframe -breakdown true \"#P.#A\";", 0))
+    channelBox_KeyPlugs(box, "setKeyframe", 0, breakdown=1)
 
 
 def channelbox_command_mute(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        cmds.channelBox(box.channelbox, e=1, exe=("mute \"#P.#A\";", 1))
+    channelBox_KeyPlugs(box, "mute", 1)
 
 
 def channelbox_command_muteAll(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        cmds.channelBox(box.channelbox, e=1, exe=("mute \"#P.#A\";", 0))
+    channelBox_KeyPlugs(box, "mute", 0)
 
 
 def channelbox_command_unmute(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        cmds.channelBox(box.channelbox, e=1, exe=("mute -disable -force \"#P.#A\";", 1))
+    channelBox_KeyPlugs(box, "mute", 1, disable=1, force=1)
 
 
 def channelbox_command_unmuteAll(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        cmds.channelBox(box.channelbox, e=1, exe=("mute -disable -force \"#P.#A\";", 0))
+    channelBox_KeyPlugs(box, "mute", 0, disable=1, force=1)
 
 
 def channelbox_command_syncGraph_scriptJob(box, *args):
+    # drag selecting channels fires this for every channel passed over, so the graph editor is only updated once
+    #   maya is idle, from whatever is selected by then
+    if not box.sync_graph_pending:
+        box.sync_graph_pending = 1
+        cmds.evalDeferred(partial(channelbox_command_syncGraph_update, box), lowestPriority=1)
+
+
+def channelbox_command_syncGraph_update(box, *args):
+    box.sync_graph_pending = 0
+    connection = "graphEditor1FromOutliner"
+    if box.menu_jobs["syncGraphEditor"] < 0 or not cmds.channelBox(box.channelbox, exists=1) or \
+            not cmds.selectionConnection(connection, exists=1):  # turned off, closed, or no graph editor
+        return
+
+    sysCmd.channelbox_selection_invalidate(box)  # don't rely on running after the box's own invalidate job
     sel_attrs = channelBox_SelectedPlugs(box)
     if sel_attrs:
-        cmds.selectionConnection("graphEditor1FromOutliner", e=1, clear=1)
+        # only what differs from the graph editor's current list is changed, there's no edit for a whole list
+        current = cmds.selectionConnection(connection, q=1, object=1) or []
+        wanted = set(sel_attrs)
+        for attr in current:
+            if attr not in wanted:
+                cmds.selectionConnection(connection, e=1, deselect=attr)
+        current = set(current)
         for attr in sel_attrs:
-            cmds.selectionConnection("graphEditor1FromOutliner", e=1, select=attr)
+            if attr not in current:
+                cmds.selectionConnection(connection, e=1, select=attr)
 
 
 # --
@@ -122,136 +141,20 @@ def channelbox_command_syncTimeline(box, menuItem, key, *args):
 
 # --
 def channelbox_command_cut(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        cmd = ""
-        okay = 0
-
-        def loop(which, _cmd, _okay):
-            obj_list = cmds.channelBox(box.channelbox, q=1, mainObjectList=which[0], shapeObjectList=which[1],
-                                       historyObjectList=which[2], outputObjectList=which[3])
-            attr_list = cmds.channelBox(box.channelbox, q=1, selectedMainAttributes=which[0],
-                                        selectedShapeAttributes=which[1], selectedHistoryAttributes=which[2],
-                                        selectedOutputAttributes=which[3])
-
-            if obj_list and attr_list:
-                _cmd += "cutKey -t \":\" -f \":"
-                for channel in attr_list:
-                    _cmd += "\" -at \"" + channel
-                for obj in obj_list:
-                    _cmd += "\" " + obj
-                _cmd += ";"
-                _okay = 1
-
-            return _cmd, _okay
-
-        cmd, okay = loop([1, 0, 0, 0], cmd, okay)
-        cmd, okay = loop([0, 1, 0, 0], cmd, okay)
-        cmd, okay = loop([0, 0, 1, 0], cmd, okay)
-        cmd, okay = loop([0, 0, 0, 1], cmd, okay)
-
-        if okay == 1:
-            print cmd
-            print "// Result: " + str(mel.eval(cmd)) + " //"
+    channelBox_KeyOperation(box, "cutKey")
 
 
 def channelbox_command_copy(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        cmd = ""
-        okay = 0
-
-        def loop(which, _cmd, _okay):
-            obj_list = cmds.channelBox(box.channelbox, q=1, mainObjectList=which[0], shapeObjectList=which[1],
-                                       historyObjectList=which[2], outputObjectList=which[3])
-            attr_list = cmds.channelBox(box.channelbox, q=1, selectedMainAttributes=which[0],
-                                        selectedShapeAttributes=which[1], selectedHistoryAttributes=which[2],
-                                        selectedOutputAttributes=which[3])
-
-            if obj_list and attr_list:
-                _cmd += "copyKey -t \":\" -f \":"
-                for channel in attr_list:
-                    _cmd += "\" -at \"" + channel
-                for obj in obj_list:
-                    _cmd += "\" " + obj
-                _cmd += ";"
-                _okay = 1
-
-            return _cmd, _okay
-
-        cmd, okay = loop([1, 0, 0, 0], cmd, okay)
-        cmd, okay = loop([0, 1, 0, 0], cmd, okay)
-        cmd, okay = loop([0, 0, 1, 0], cmd, okay)
-        cmd, okay = loop([0, 0, 0, 1], cmd, okay)
-
-        if okay == 1:
-            print cmd
-            print "// Result: " + str(mel.eval(cmd)) + " //"
+    channelBox_KeyOperation(box, "copyKey")
 
 
 def channelbox_command_paste(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        cmd = ""
-        okay = 0
-        current_time = cmds.currentTime(q=1)
-
-        def loop(which, _cmd, _okay):
-            obj_list = cmds.channelBox(box.channelbox, q=1, mainObjectList=which[0], shapeObjectList=which[1],
-                                      historyObjectList=which[2], outputObjectList=which[3])
-            attr_list = cmds.channelBox(box.channelbox, q=1, selectedMainAttributes=which[0],
-                                       selectedShapeAttributes=which[1], selectedHistoryAttributes=which[2],
-                                       selectedOutputAttributes=which[3])
-
-            if obj_list and attr_list:
-                _cmd += "pasteKey -connect true -time " + str(current_time) + " "
-                for channel in attr_list:
-                    _cmd += "-at \"" + channel + "\" "
-                for obj in obj_list:
-                    _cmd += obj
-                _cmd += ";"
-                _okay = 1
-
-            return _cmd, _okay
-
-        cmd, okay = loop([1, 0, 0, 0], cmd, okay)
-        cmd, okay = loop([0, 1, 0, 0], cmd, okay)
-        cmd, okay = loop([0, 0, 1, 0], cmd, okay)
-        cmd, okay = loop([0, 0, 0, 1], cmd, okay)
-
-        if okay == 1:
-            print cmd
-            print "// Result: " + str(mel.eval(cmd)) + " //"
+    current_time = cmds.currentTime(q=1)
+    channelBox_KeyOperation(box, "pasteKey", connect=True, time=(current_time, current_time))
 
 
 def channelbox_command_delete(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        cmd = ""
-        okay = 0
-
-        def loop(which, _cmd, _okay):
-            obj_list = cmds.channelBox(box.channelbox, q=1, mainObjectList=which[0], shapeObjectList=which[1],
-                                       historyObjectList=which[2], outputObjectList=which[3])
-            attr_list = cmds.channelBox(box.channelbox, q=1, selectedMainAttributes=which[0],
-                                        selectedShapeAttributes=which[1], selectedHistoryAttributes=which[2],
-                                        selectedOutputAttributes=which[3])
-
-            if obj_list and attr_list:
-                _cmd += "cutKey -cl -t \":\" -f \":"
-                for channel in attr_list:
-                    _cmd += "\" -at \"" + channel
-                for obj in obj_list:
-                    _cmd += "\" " + obj
-                _cmd += ";"
-                _okay = 1
-
-            return _cmd, _okay
-
-        cmd, okay = loop([1, 0, 0, 0], cmd, okay)
-        cmd, okay = loop([0, 1, 0, 0], cmd, okay)
-        cmd, okay = loop([0, 0, 1, 0], cmd, okay)
-        cmd, okay = loop([0, 0, 0, 1], cmd, okay)
-
-        if okay == 1:
-            print cmd
-            print "// Result: " + str(mel.eval(cmd)) + " //"
+    channelBox_KeyOperation(box, "cutKey", clear=True)
 
 
 # --
@@ -349,69 +252,39 @@ def channelbox_command_freezeUI():
 
 # --
 def channelbox_command_break(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        for plug in channelBox_SelectedPlugs(box):
-            if cmds.connectionInfo(plug, isDestination=1):
-                destination = cmds.connectionInfo(plug, getExactDestination=1)
-
-                # when delete source conn from character, must remove from character set or set becomes inconsistent
-                src_conn = cmds.listConnections(destination, s=1, d=0, type="character")
-                if src_conn:
-                    warn_msg = "Removed \'^1s\' from character \'^2s\'."
-                    cmds.warning(cmds.format(warn_msg, s=(destination, src_conn[0])))
-                    cmds.character(destination, e=1, rm=src_conn[0])
-
-                # is tracking edits?
-                import maya.api.OpenMaya as om
-                obj = om.MSelectionList().add(destination).getDependNode(0)
-                depend_fn = om.MFnDependencyNode(obj)
-                tracking_edits = depend_fn.isTrackingEdits()
-                del obj
-                del depend_fn
-
-                if tracking_edits:
-                    src = cmds.connectionInfo(destination, sourceFromDestination=1)
-                    cmds.disconnectAttr(src, destination)
-                else:
-                    cmds.delete(destination, icn=1)
+    channelBox_BreakConnections(channelBox_SelectedPlugs(box))
 
 
 def channelbox_command_selectConnection(box, menuItem, key, *args):
     with sysCmd.Undo():
-        for plug in channelBox_SelectedPlugs(box):
-            if cmds.connectionInfo(plug, isDestination=1):
-                destination = cmds.connectionInfo(plug, getExactDestination=1)
-                dest_input = cmds.listConnections(destination)
-                cmds.select(dest_input[0], r=1)
+        sources = channelBox_PlugSources(channelBox_SelectedPlugs(box), select_connection_through)
+        if sources:
+            cmds.select(sources, r=1)
 
 
 # --
 def channelbox_command_lock(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        for p in channelBox_SelectedPlugs(box):
-            cmds.setAttr(p, lock=1)
+    channelBox_SetPlugFlags(channelBox_SelectedPlugs(box), lock=1)
 
 
 def channelbox_command_unlock(box, menuItem, key, *args):
-    with sysCmd.Undo():
-        for p in channelBox_SelectedPlugs(box):
-            cmds.setAttr(p, lock=0)
+    channelBox_SetPlugFlags(channelBox_SelectedPlugs(box), lock=0)
 
 
 def channelbox_command_unkeyable(box, menuItem, key, *args):
-    cmds.channelBox(box.channelbox, e=1, exe=("setAttr -keyable false -channelBox false \"#P.#A\";", 1))
+    channelBox_SetPlugFlags(channelBox_SelectedPlugs(box), keyable=0, channelBox=0)
 
 
 def channelbox_command_lockUnkeyable(box, menuItem, key, *args):
-    cmds.channelBox(box.channelbox, e=1, exe=("setAttr -lock true -keyable false -channelBox false \"#P.#A\";", 1))
+    channelBox_SetPlugFlags(channelBox_SelectedPlugs(box), lock=1, keyable=0, channelBox=0)
 
 
 def channelbox_command_unkeyableDisplayed(box, menuItem, key, *args):
-    cmds.channelBox(box.channelbox, e=1, exe=("setAttr -keyable false -channelBox true \"#P.#A\";", 1))
+    channelBox_SetPlugFlags(channelBox_SelectedPlugs(box), keyable=0, channelBox=1)
 
 
 def channelbox_command_keyable(box, menuItem, key, *args):
-    cmds.channelBox(box.channelbox, e=1, exe=("setAttr -keyable true \"#P.#A\";", 1))
+    channelBox_SetPlugFlags(channelBox_SelectedPlugs(box), keyable=1)
 
 
 # --
@@ -805,8 +678,10 @@ def channelBox_filterAttrs(box):
             if value:
                 names.append(key)
 
-        box.filter = cmds.itemFilterAttr(byNameString=names, negate=box.saved_states["invertShown"][0])
+        box.filter = channelBox_FilterNode(box, ("byNameString", tuple(sorted(names))),
+                                           box.saved_states["invertShown"][0])
         cmds.channelBox(box.channelbox, e=1, attrFilter=box.filter, update=1)
+        channelBox_FilterCollect(box)
 
 
 def channelbox_command_isolateAttr(box, menuItem, key, *args):
@@ -949,66 +824,53 @@ def channelbox_command_filter_filterShowAll(box, menuItem, key, *args):
         channelBox_Filter_Items(box)
 
 
+# PRE-DEFINED FILTERS : the "Show" menu checkbox key and what it filters by, add your own here and give them a
+#  checkbox with the same key that uses channelbox_command_filter_itemCB
+#   ("flag", value)            : an itemFilterAttr flag, eg. ("hasCurve", 1)
+#   [names]                    : attribute names, every name from all active name filters is combined into one filter
+#   ("any", [..]) / ("all", [..]) : a union / intersection of other definitions, eg. only animated rotates would be
+#                                ("all", [("hasCurve", 1), ("byNameString", ("rotateX", "rotateY", "rotateZ"))])
+filter_definitions = {
+    "attr_animCurve": ("hasCurve", 1),
+    "attr_expression": ("hasExpression", 1),
+    "attr_drivenKey": ("hasDrivenKey", 1),
+    "attr_scaleRotateTranslate": ("scaleRotateTranslate", 1),
+    "attr_translate": ["translateX", "translateY", "translateZ"],
+    "attr_rotate": ["rotateX", "rotateY", "rotateZ"],
+    "attr_scale": ["scaleX", "scaleY", "scaleZ"],
+}
+
+
 def channelBox_Filter_Items(box):
     with sysCmd.Undo(0):
-        filters = []
+        definitions = []  # describe the filters, nodes are only created for definitions that haven't been seen
         names = []
 
         for f in box.filter_items:
-            if f == "attr_userDefined":
+            if f == "attr_userDefined":  # depends on the selection, so can't be pre-defined
                 user_cb = cmds.listAttr(ud=1, cb=1)
                 user_kv = cmds.listAttr(ud=1, k=1, v=1)
                 if user_cb:
                     names += user_cb
                 if user_kv:
                     names += user_kv
-            elif f == "attr_translate":
-                names.append("translateX")
-                names.append("translateY")
-                names.append("translateZ")
-            elif f == "attr_rotate":
-                names.append("rotateX")
-                names.append("rotateY")
-                names.append("rotateZ")
-            elif f == "attr_scale":
-                names.append("scaleX")
-                names.append("scaleY")
-                names.append("scaleZ")
-            else:
-                filters.append(f.split("_")[-1])
-
-        if len(filters) == 0 and len(names) == 0:
-            cmds.channelBox(box.channelbox, e=1, update=1)
-            return
+            elif f in filter_definitions:
+                if isinstance(filter_definitions[f], list):
+                    names += filter_definitions[f]
+                else:
+                    definitions.append(filter_definitions[f])
 
-        _f = []  # create the actual filters
-        if "animCurve" in filters:
-            _f.append(cmds.itemFilterAttr(hasCurve=1))
-        if "expression" in filters:
-            _f.append(cmds.itemFilterAttr(hasExpression=1))
-        if "drivenKey" in filters:
-            _f.append(cmds.itemFilterAttr(hasDrivenKey=1))
-        if "scaleRotateTranslate" in filters:
-            _f.append(cmds.itemFilterAttr(scaleRotateTranslate=1))
         if names:
-            _f.append(cmds.itemFilterAttr(byNameString=names))
-
-        destination = _f[0]
-        odd = len(_f) % 2  # determines odd/even number
-        loops = len(_f) / 2 + (1 if odd else 0)
+            definitions.append(("byNameString", tuple(sorted(set(names)))))
 
-        for i in range(loops):  # create union filters
-            index_1 = i * 2
-            index_2 = i * 2 + 1
-            use_last = odd and i + 1 == loops
-            destination = cmds.itemFilterAttr(union=(_f[index_1], _f[index_2] if not use_last else destination))
+        if not definitions:
+            cmds.channelBox(box.channelbox, e=1, update=1)
+            return
 
-        box.filter = destination
-        cmds.itemFilterAttr(box.filter, e=1, negate=box.saved_states["invertShown"][0])
+        # sorted so the same combination always builds the same tree no matter the order filters were toggled in
+        box.filter = channelBox_FilterTree(box, sorted(definitions), box.saved_states["invertShown"][0])
         cmds.channelBox(box.channelbox, e=1, attrFilter=box.filter, update=1)
-
-        for f in _f:
-            cmds.delete(f)
+        channelBox_FilterCollect(box)
 
 
 # -----------------------------------------  
@@ -1074,43 +936,317 @@ def channelBox_MelArray_Conversion(mel_array):
     return string
 
 
+# most attributes given to a single animLayer edit, larger edits are split
+layer_chunk_size = 500
+
+
 def channelBox_ModifyPlugsInLayers(plugs, layers, operation):
+    # add (operation 1) or remove (0) the plugs from each layer, one animLayer edit per layer for all the plugs
+    #   that aren't already in (or out of) it, then print one summary
     if not plugs:
         cmds.error("No channel attributes selected.")
     if not layers:
         cmds.error("No layer is selected.  Please select a layer.")
 
+    start = time.time()
+    names = channelBox_PlugNames(plugs)
+    flag = "attribute" if operation else "removeAttribute"
+    changed = 0
+    skipped = 0
+    edited = 0
+
     for layer in layers:
         if not cmds.objectType(layer, isType="animLayer"):
             continue
-        for plug in plugs:
-            if operation:
-                mel.eval("evalEcho( \"animLayer -edit -attribute " + plug + " " + layer + "\");")
-            else:
-                mel.eval("evalEcho( \"animLayer -edit -removeAttribute " + plug + " " + layer + "\");")
+        members = set(channelBox_PlugNames(cmds.animLayer(layer, q=1, attribute=1) or []))
+        todo = [plug for plug, name in zip(plugs, names) if (name in members) != operation]
+        skipped += len(plugs) - len(todo)
+        for i in range(0, len(todo), layer_chunk_size):
+            cmds.animLayer(layer, e=1, **{flag: todo[i:i + layer_chunk_size]})
+        changed += len(todo)
+        edited += 1
 
+    print "// Result: %s %d attribute(s) %s %d layer(s), %d already %s (%.3fs) //" % (
+        "added" if operation else "removed", changed, "to" if operation else "from", edited, skipped,
+        "in them" if operation else "out of them", time.time() - start)
+
+
+def channelBox_PlugNames(plugs):
+    # the same name for a plug however it was given, eg. short or long attribute names, for comparing plugs
+    if om is None:
+        return list(plugs)
+
+    result = []
+    sel = om.MSelectionList()
+    for plug in plugs:
+        try:
+            sel.clear()
+            sel.add(plug)
+            result.append(sel.getPlug(0).name())
+        except (RuntimeError, TypeError):  # a plug the api can't resolve, compare it as given
+            result.append(plug)
+    return result
+
+
+# how many itemFilterAttr nodes a channel box keeps around for reuse before unused ones are deleted
+filter_cache_size = 24
+
+
+def channelBox_FilterNode(box, definition, negate=0):
+    # itemFilterAttr node for a definition, created once and reused for as long as it exists in the scene, the cache
+    # is cleared when the scene changes (see sysCmd.channelbox_filter_nodes_clear) as new nodes can take old names
+    # definition : (flag, value) eg. ("hasCurve", 1), ("byNameString", ("translateX", ..)) or ("union", node, node)
+    key = definition + (negate,)
+    node = box.filter_nodes.pop(key, None)  # re-inserted below to mark it as the most recently used
+    if node is None or not cmds.objExists(node):  # nodes are lost with the scene, eg. on file new
+        flag = definition[0]
+        if flag == "union" or flag == "intersect":
+            value = definition[1:]
+        elif flag == "byNameString":
+            value = list(definition[1])
+        else:
+            value = definition[1]
+        node = cmds.itemFilterAttr(negate=negate, **{flag: value})
+    box.filter_nodes[key] = node
+    return node
+
+
+def channelBox_FilterTree(box, definitions, negate=0, operation="union"):
+    # balanced tree joining any number of definitions with "union" or "intersect", halving each level so depth grows
+    # with log2 of the count, only the root carries negate so the nodes below it can be shared with other combinations
+    # a definition of ("any", [..]) or ("all", [..]) is built as its own union / intersection tree first
+    if not definitions:
+        cmds.error("Filter definition has nothing to filter by.")
+
+    if len(definitions) == 1:
+        definition = definitions[0]
+        if definition[0] == "any" or definition[0] == "all":
+            return channelBox_FilterTree(box, sorted(definition[1]), negate,
+                                         "union" if definition[0] == "any" else "intersect")
+        return channelBox_FilterNode(box, definition, negate)
+
+    half = len(definitions) / 2
+    left = channelBox_FilterTree(box, definitions[:half], 0, operation)
+    right = channelBox_FilterTree(box, definitions[half:], 0, operation)
+    return channelBox_FilterNode(box, (operation, left, right), negate)
+
+
+def channelBox_FilterCollect(box):
+    # delete the least recently used filter nodes that the active filter doesn't depend on once over the cache size
+    if len(box.filter_nodes) <= filter_cache_size:
+        return
+
+    children = {}
+    for key, node in box.filter_nodes.iteritems():
+        if key[0] == "union" or key[0] == "intersect":
+            children[node] = key[1:3]
+    active = set()
+    pending = [box.filter]
+    while pending:
+        node = pending.pop()
+        if node not in active:
+            active.add(node)
+            pending.extend(children.get(node, ()))
+
+    doomed = set()
+    excess = len(box.filter_nodes) - filter_cache_size
+    for key, node in box.filter_nodes.iteritems():
+        if len(doomed) >= excess:
+            break
+        if node not in active:
+            doomed.add(node)
+
+    changed = 1
+    while changed:  # unions built on a deleted node can't be reused either
+        changed = 0
+        for node, (left, right) in children.iteritems():
+            if node not in doomed and (left in doomed or right in doomed):
+                doomed.add(node)
+                changed = 1
+
+    for key, node in box.filter_nodes.items():
+        if node in doomed:
+            del box.filter_nodes[key]
+            if cmds.objExists(node):
+                cmds.delete(node)
+
+
+def channelBox_KeyOperation(box, operation, **kwargs):
+    # runs cutKey / copyKey / pasteKey on the selected channels, one call per channel box section with the objects
+    # and attributes passed as lists, kwargs are passed on to the command eg. clear=True
+    # prints a one line summary rather than echoing each command
+    start = time.time()
+    command = getattr(cmds, operation)
+    result = 0
+    plugs = 0
+
+    with sysCmd.Undo():
+        for obj_list, attr_list in sysCmd.channelbox_selection(box).sections:
+            if not obj_list or not attr_list:
+                continue
+
+            result += command(obj_list, attribute=attr_list, **kwargs) or 0
+            plugs += len(obj_list) * len(attr_list)
+
+    if not plugs:
+        return
+    print "// Result: %s on %d attribute(s) : %d (%.3fs) //" % (operation, plugs, result, time.time() - start)
+
+
+# node types Select Connection looks past to whatever drives them, eg. ("unitConversion", "pairBlend") selects the
+#   animation curves or constraints behind them instead, empty selects the node connected to each channel
+select_connection_through = ()
+
+
+def channelBox_PlugSources(plugs, through=()):
+    # nodes connected into the plugs, in the order of the plugs without repeats, found with one listConnections
+    # call for every plug, plus one for each node of a "through" type walked past
+    destinations = []
+    for plug in plugs:
+        destination = cmds.connectionInfo(plug, getExactDestination=1)
+        if destination and destination not in destinations:
+            destinations.append(destination)
+    if not destinations:
+        return []
 
-def channelBox_SelectedPlugs(box):
     result = []
+    seen = set()
+
+    def add(nodes):
+        walk = set(cmds.ls(nodes, type=list(through)) or []) if through and nodes else ()
+        for node in nodes:
+            if node in seen:
+                continue
+            seen.add(node)
+            if node in walk:
+                add(cmds.listConnections(node, s=1, d=0) or [])
+            else:
+                result.append(node)
+
+    add(cmds.listConnections(destinations, s=1, d=0) or [])
+    return result
+
 
-    def loop(which, _result):
-        obj_list = cmds.channelBox(box.channelbox, q=1, mainObjectList=which[0], shapeObjectList=which[1],
-                                   historyObjectList=which[2], outputObjectList=which[3])
-        attr_list = cmds.channelBox(box.channelbox, q=1, selectedMainAttributes=which[0],
-                                    selectedShapeAttributes=which[1], selectedHistoryAttributes=which[2],
-                                    selectedOutputAttributes=which[3])
+def channelBox_BreakConnections(plugs):
+    # break the incoming connection of every plug as a single undo step, the connected plug may be a parent of the
+    # one given eg. translate for translateX, and is only broken once however many of its children are given
+    # nodes tracking edits (referenced) are disconnected so the edit is recorded, the rest have their inputs deleted
+    start = time.time()
+    destinations = []
+    for plug in plugs:
+        destination = cmds.connectionInfo(plug, getExactDestination=1)
+        if destination and destination not in destinations:
+            destinations.append(destination)
+    if not destinations:
+        return
+
+    tracking_edits = {}  # node : is tracking edits, asked once per node
+    sel = om.MSelectionList() if om else None
+    disconnect = []
+    delete = []
+    for destination in destinations:
+        node = destination.split(".")[0]
+        if node not in tracking_edits:
+            if sel is not None:
+                sel.clear()
+                sel.add(node)
+                tracking_edits[node] = om.MFnDependencyNode(sel.getDependNode(0)).isTrackingEdits()
+            else:
+                tracking_edits[node] = cmds.referenceQuery(node, isNodeReferenced=1)
+        (disconnect if tracking_edits[node] else delete).append(destination)
+
+    with sysCmd.Undo():
+        # when delete source conn from character, must remove from character set or set becomes inconsistent
+        characters = {}  # character : its plugs being broken
+        src_conn = cmds.listConnections(destinations, s=1, d=0, type="character", connections=1) or []
+        for destination, character in zip(src_conn[::2], src_conn[1::2]):
+            warn_msg = "Removed \'^1s\' from character \'^2s\'."
+            cmds.warning(cmds.format(warn_msg, s=(destination, character)))
+            characters.setdefault(character, []).append(destination)
+        for character, members in characters.iteritems():
+            cmds.character(members, e=1, rm=character)
+
+        for destination in disconnect:
+            cmds.disconnectAttr(cmds.connectionInfo(destination, sourceFromDestination=1), destination)
+        if delete:
+            cmds.delete(delete, icn=1)
+
+    print "// Result: broke %d connection(s) on %d node(s) (%.3fs) //" % (len(destinations), len(tracking_edits),
+                                                                          time.time() - start)
+
+
+def channelBox_KeyPlugs(box, operation, selected=1, flags=None, **kwargs):
+    # runs setKeyframe / mute once over the selected channels (selected=1) or every channel shown (0) as a single
+    # undo step, kwargs are passed on to the command eg. breakdown=1
+    # flags : only plugs with at least one of these set are used eg. ["keyable", "channelBox"]
+    start = time.time()
+    plugs = channelBox_SelectedPlugs(box) if selected else channelBox_ShownPlugs(box)
+    if flags:
+        plugs = [plug for plug, current in zip(plugs, channelBox_PlugFlags(plugs, flags)) if any(current.values())]
+    if not plugs:
+        return
+
+    with sysCmd.Undo():
+        result = getattr(cmds, operation)(list(plugs), **kwargs)
 
-        if obj_list and attr_list:
-            for obj in obj_list:
-                for attr in attr_list:
-                    _result.append(obj + "." + attr)
+    result = len(result) if isinstance(result, list) else result or 0  # mute gives its nodes, setKeyframe a count
+    print "// Result: %s on %d attribute(s) : %d (%.3fs) //" % (operation, len(plugs), result, time.time() - start)
 
-        return _result
 
-    result = loop([1, 0, 0, 0], result)
-    result = loop([0, 1, 0, 0], result)
-    result = loop([0, 0, 1, 0], result)
-    result = loop([0, 0, 0, 1], result)
+def channelBox_ShownPlugs(box):
+    # every "obj.attr" shown in the channel box, as the channel box lists them to exe so filters etc. are respected
+    # the MEL run per channel only collects its name, the commands using these then run once over the whole list
+    mel.eval("global string $gjtChannelBoxPlugs[]; clear $gjtChannelBoxPlugs;")
+    cmds.channelBox(box.channelbox, e=1, exe=("global string $gjtChannelBoxPlugs[]; "
+                                              "$gjtChannelBoxPlugs[size($gjtChannelBoxPlugs)] = \"#P.#A\";", 0))
+    return mel.eval("$tmpvar=$gjtChannelBoxPlugs") or []
+
+
+def channelBox_PlugFlags(plugs, flags):
+    # current state of the given flags ("lock", "keyable", "channelBox") for each plug, as a list of dicts
+    # read straight from the plugs through the api where possible rather than a getAttr per flag per plug
+    result = []
+    sel = om.MSelectionList() if om else None
+
+    for plug in plugs:
+        current = None
+        if sel is not None:
+            try:
+                sel.clear()
+                sel.add(plug)
+                m_plug = sel.getPlug(0)
+                current = {"lock": m_plug.isLocked, "keyable": m_plug.isKeyable, "channelBox": m_plug.isChannelBox}
+            except (RuntimeError, TypeError):  # a plug the api can't resolve, ask cmds instead
+                current = None
+        if current is None:
+            current = {flag: cmds.getAttr(plug, **{flag: 1}) for flag in flags}
+        result.append({flag: int(current[flag]) for flag in flags})
 
     return result
+
+
+def channelBox_SetPlugFlags(plugs, lock=None, keyable=None, channelBox=None):
+    # set lock / keyable / channelBox on all plugs as a single undo step, flags left as None aren't touched
+    # plugs already in the requested state are skipped so they don't cost a setAttr or an undo entry
+    start = time.time()
+    wanted = [(flag, value) for flag, value in [("lock", lock), ("keyable", keyable), ("channelBox", channelBox)]
+              if value is not None]
+    if not plugs or not wanted:
+        return
+
+    changed = 0
+    with sysCmd.Undo():
+        for plug, current in zip(plugs, channelBox_PlugFlags(plugs, [flag for flag, value in wanted])):
+            edits = {flag: value for flag, value in wanted if current[flag] != value}
+            if edits:
+                cmds.setAttr(plug, **edits)
+                changed += 1
+
+    print "// Result: " + str(changed) + " of " + str(len(plugs)) + " attribute(s) changed (%.3fs) //" % (
+        time.time() - start)
+
+
+def channelBox_SelectedPlugs(box):
+    # tuple of "obj.attr" for the selected channels, cached until the channel box selection changes
+    return sysCmd.channelbox_selection(box).plugs()
     # -----------------------------------------  
@@ -19,6 +19,10 @@
 
 import maya.cmds as cmds
 import os
+import getpass
+import shutil
+import socket
+import threading
 from functools import partial
 
 try:
@@ -32,6 +36,14 @@ except:
 #                    Define Any Custom Save Behaviour Here                         #
 # -------------------------------------------------------------------------------- #
 
+# STATE LOCATION : Where state files are kept, can also be set with environment variables
+#   state_local_path : folder state files are read from and written to, by default a per-user, per-host folder in
+#                      the local cache, eg. %LOCALAPPDATA%\jtChannelBox\<host> or ~/.cache/jtChannelBox/<host>
+#   state_share_path : optional shared folder, each write is copied to <state_share_path>/<user> in the background,
+#                      and a host's first run starts from that copy
+state_local_path = os.environ.get("JTCHANNELBOX_STATE_LOCAL")
+state_share_path = os.environ.get("JTCHANNELBOX_STATE_SHARE")
+
 
 # -------------------------------------------------------------------------------- #
 #                     -- MODIFY BELOW THIS LINE AT OWN RISK --                     #
@@ -74,13 +86,86 @@ class rpartial(partial):
         return self.result
 
 
+# -------------------------------------------------------------------------------- #
+
+# SELECTION() : Snapshot of the objects and selected attributes in each section of a channel box
+# Captured once and shared by every enable check and command in one interaction instead of each one querying,
+#   channelbox_selection() returns the current snapshot and it's dropped whenever the selection changes
+class Selection(object):
+    def __init__(self, channelbox):
+        self.main = (cmds.channelBox(channelbox, q=1, mainObjectList=1) or [],
+                     cmds.channelBox(channelbox, q=1, selectedMainAttributes=1) or [])
+        self.shape = (cmds.channelBox(channelbox, q=1, shapeObjectList=1) or [],
+                      cmds.channelBox(channelbox, q=1, selectedShapeAttributes=1) or [])
+        self.history = (cmds.channelBox(channelbox, q=1, historyObjectList=1) or [],
+                        cmds.channelBox(channelbox, q=1, selectedHistoryAttributes=1) or [])
+        self.output = (cmds.channelBox(channelbox, q=1, outputObjectList=1) or [],
+                       cmds.channelBox(channelbox, q=1, selectedOutputAttributes=1) or [])
+        self.sections = [self.main, self.shape, self.history, self.output]
+        self.section_plugs = None  # {section name : tuple of "obj.attr" plugs}, built on first use
+        self.all_plugs = None
+
+    def has_channels(self):  # any section with both objects and selected attributes
+        for obj_list, attr_list in self.sections:
+            if obj_list and attr_list:
+                return 1
+        return 0
+
+    def plugs(self, section=None):  # selected plugs of every section, or only the given section eg. "shape"
+        if self.all_plugs is None:  # built once per snapshot, every command in one interaction reuses it
+            self.section_plugs = {}
+            for name, (obj_list, attr_list) in zip(["main", "shape", "history", "output"], self.sections):
+                self.section_plugs[name] = tuple([obj + "." + attr for obj in obj_list for attr in attr_list])
+            self.all_plugs = (self.section_plugs["main"] + self.section_plugs["shape"] +
+                              self.section_plugs["history"] + self.section_plugs["output"])
+        return self.all_plugs if section is None else self.section_plugs[section]
+
+
+def channelbox_selection(box, *args):
+    if box.selection is None:
+        box.selection = Selection(box.channelbox)
+    return box.selection
+
+
+def channelbox_selection_invalidate(box, *args):  # called by script jobs when the channel box selection changes
+    box.selection = None
+
+
+def channelbox_filter_nodes_clear(box, *args):  # called by script jobs when the scene changes
+    # the cached itemFilterAttr nodes went with the old scene, and the new one can give their names to other nodes
+    box.filter_nodes.clear()
+
+
 # -------------------------------------------------------------------------------- #
 
 # SaveState : For saving any savedState values to the disk to persist next run
 # Using this over channelBox_WriteState allows defining anything that runs prior
 #   or following writing data & is more readable in code
+# The write is deferred until maya is idle so a run of changes only writes once, it's also
+#   flushed when the channel box is deleted or maya exits
 def channelbox_save_state(box, *args):
-    channelbox_pickle_write_state(box)
+    if not box.state_persist:
+        return
+
+    box.state_dirty = 1
+    if not box.state_flush_pending:
+        box.state_flush_pending = 1
+        cmds.evalDeferred(partial(channelbox_flush_state, box), lowestPriority=1)
+
+
+def channelbox_flush_state(box, *args):  # write the state now if anything changed since the last write
+    box.state_flush_pending = 0
+    if box.state_dirty:
+        channelbox_pickle_write_state(box)
+
+
+def channelbox_close(box, *args):  # called when the channel box is deleted
+    channelbox_flush_state(box)
+    with Undo(0):
+        for node in box.filter_nodes.values():  # only this scene's nodes, see channelbox_filter_nodes_clear
+            if cmds.objExists(node):
+                cmds.delete(node)
+    box.filter_nodes.clear()
 
 
 # -------------------------------------------------------------------------------- #
@@ -92,33 +177,165 @@ def channelbox_get_path():
     return os.path.realpath(__file__).split(os.path.basename(__file__))[0]
 
 
+def channelbox_get_state_path():  # local folder for state files, see STATE LOCATION
+    path = state_local_path
+    if not path:
+        cache = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or \
+                os.path.join(os.path.expanduser("~"), ".cache")
+        path = os.path.join(cache, "jtChannelBox", socket.gethostname())
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    return os.path.join(path, "")
+
+
+def channelbox_get_share_path():  # this user's folder in the shared location, or None if there isn't one
+    return os.path.join(state_share_path, getpass.getuser(), "") if state_share_path else None
+
+
+def channelbox_replace_file(src, dst):  # move src over dst in one step where the os allows it
+    try:
+        os.rename(src, dst)
+    except OSError:  # windows won't rename over an existing file
+        os.remove(dst)
+        os.rename(src, dst)
+
+
+state_sync_lock = threading.Lock()  # held by a background thread for as long as it's using the network
+state_sync_pending = {}  # shared file : contents waiting to be written there, only the newest is kept
+state_sync_pending_lock = threading.Lock()  # only held to change state_sync_pending, so never waits on the network
+
+
+def channelbox_sync_state(box, *args):
+    # copy the local state file to the shared location on a background thread so writes never wait on the network
+    share = channelbox_get_share_path()
+    if not share:
+        return
+
+    # read here, once the write has finished, so the copy can't catch the local file half written or being replaced
+    with open(channelbox_get_state_path() + box.state_file + ".data", "rb") as _file:
+        channelbox_sync_share(share, box.state_file + ".data", _file.read())
+
+
+def channelbox_sync_share(share, name, data):
+    # write data to the shared file on a background thread, or remove it if data is None, a thread that starts after
+    #  a newer one for the same file was queued writes the newest instead
+    dst = share + name
+    with state_sync_pending_lock:
+        state_sync_pending[dst] = data
+
+    def sync():
+        with state_sync_lock:
+            with state_sync_pending_lock:
+                if dst not in state_sync_pending:  # an earlier thread already wrote what this one was started for
+                    return
+                _data = state_sync_pending.pop(dst)
+            try:
+                if _data is None:
+                    if os.path.isfile(dst):
+                        os.remove(dst)
+                else:
+                    if not os.path.isdir(share):
+                        os.makedirs(share)
+                    with open(dst + ".tmp", "wb") as _file:
+                        _file.write(_data)
+                    channelbox_replace_file(dst + ".tmp", dst)
+            except (IOError, OSError):  # the shared copy is only a convenience, the local file is what's used
+                pass
+
+    thread = threading.Thread(target=sync)
+    thread.daemon = True
+    thread.start()
+
+
+# STATE FILE FORMAT : a header record followed by pickled dicts of only the keys that changed since the last
+#   write, later records override earlier ones. Once there are state_compact_after records the file is rewritten
+#   as the header plus a single record. Files from before the header existed (one plain dict) are read as is and
+#   rewritten in this format on the next write
+state_header = ("jtChannelBox_State", 2)
+state_compact_after = 32
+
+
 def channelbox_pickle_write_state(box, *args):
     if not box.state_persist:
         return
 
-    with open(channelbox_get_path() + box.state_file + ".data", "wb") as _file:
-        try:
-            _dict = {k: v for k, v in box.saved_states.iteritems() if v[1] == 1}
-            pickle.dump(_dict, _file)
-        except IndexError:
-            cmds.error("Could not load state file")
+    box.state_dirty = 0
+    path = channelbox_get_state_path() + box.state_file + ".data"
+    try:
+        _dict = {k: v for k, v in box.saved_states.iteritems() if v[1] == 1}
+    except IndexError:
+        cmds.error("Could not load state file")
+    # pickled per key to find what changed, savedFilters etc. are modified in place so can't be compared to a reference
+    written = {k: pickle.dumps(v, pickle.HIGHEST_PROTOCOL) for k, v in _dict.iteritems()}
+
+    if box.state_written is None or box.state_records >= state_compact_after or not os.path.exists(path):
+        with open(path + ".tmp", "wb") as _file:  # written beside the real file first so a failed write can't corrupt it
+            pickle.dump(state_header, _file, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(_dict, _file, pickle.HIGHEST_PROTOCOL)
+
+        channelbox_replace_file(path + ".tmp", path)
+        box.state_records = 1
+    else:
+        changed = {k: v for k, v in _dict.iteritems() if box.state_written.get(k) != written[k]}
+        if changed:
+            with open(path, "ab") as _file:
+                pickle.dump(changed, _file, pickle.HIGHEST_PROTOCOL)
+            box.state_records += 1
+
+    box.state_written = written
+    channelbox_sync_state(box)
 
 
 def channelbox_pickle_read_state(box, *args):
     if not box.state_persist:
         return
 
-    with open(channelbox_get_path() + box.state_file + ".data", "rb") as _file:
+    path = channelbox_get_state_path() + box.state_file + ".data"
+    if not os.path.exists(path):
+        # first run on this host, start from the shared copy or a file left beside the scripts by older versions,
+        #  the only time creating a channel box reads from anywhere but the local folder
+        for seed in [channelbox_get_share_path(), channelbox_get_path()]:
+            if seed and os.path.isfile(seed + box.state_file + ".data"):
+                # copied beside the real file first so an interrupted copy can't leave a broken one behind
+                shutil.copyfile(seed + box.state_file + ".data", path + ".tmp")
+                channelbox_replace_file(path + ".tmp", path)
+                break
+
+    with open(path, "rb") as _file:
         try:
             _dict = pickle.load(_file)
-            for k, v in box.saved_states.iteritems():
-                box.saved_states[k] = _dict[k] if k in _dict and v[1] == 1 else v
-        except IOError, EOFError:
+        except (EOFError, pickle.UnpicklingError):
             cmds.error("Could not load state file")
 
+        if _dict == state_header:
+            _dict = {}
+            records = 0
+            size = os.fstat(_file.fileno()).st_size
+            while _file.tell() < size:
+                try:
+                    _dict.update(pickle.load(_file))
+                    records += 1
+                except Exception:  # a record cut short by maya closing mid-write, keep everything before it
+                    records = state_compact_after  # and rewrite the file next time, appending after it would be lost
+                    break
+        else:  # older file without a header, rewrite it in the current format next time
+            records = state_compact_after
+
+    for k, v in box.saved_states.iteritems():
+        box.saved_states[k] = _dict[k] if k in _dict and v[1] == 1 else v
+
+    box.state_records = records
+    box.state_written = {k: pickle.dumps(v, pickle.HIGHEST_PROTOCOL) for k, v in _dict.iteritems()}
+
 
 def channelbox_pickle_delete_state(box):
     if not box.state_persist:
         return
 
-    os.remove(channelbox_get_path() + box.state_file + ".data")
+    box.state_dirty = 0  # a pending write would otherwise bring the file straight back
+    box.state_written = None
+    os.remove(channelbox_get_state_path() + box.state_file + ".data")
+
+    share = channelbox_get_share_path()
+    if share:  # on the background thread, as for writes
+        channelbox_sync_share(share, box.state_file + ".data", None)
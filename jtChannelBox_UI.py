@@ -28,6 +28,7 @@ Interface with saved menu sets to house the jtChannelBox module
 import maya.cmds as cmds
 import maya.mel as mel
 import base64  # for encoding/decoding scene-specific data to save menu sets
+import copy
 from functools import partial
 from collections import OrderedDict
 import jtChannelBox as CBox
@@ -42,14 +43,12 @@ except:
 
 
 def persistent_menu_sets():
-    menus = data_load()
-    persist = []
+    persist = OrderedDict()
 
     # to add a module in a subfolder use subfoldername.modulename and ensure there is an
     #  __init__.py file present with the module
     def add(name, module):
-        menus[name] = module
-        persist.append(name)
+        persist[name] = module
 
         # add persistent menus here - these will be automatically added to your
 
@@ -59,7 +58,15 @@ def persistent_menu_sets():
     add("Animation", "jtChannelBox_Menu_Animation")
     add("Default", "jtChannelBox_Menu_Default")
 
-    data_save(persist, "menuSets_persist")
+    # only write to fileInfo (which marks the scene as modified) when one of the persistent sets is missing from the
+    #  scene's menu sets or differs, or the scene's list of persistent sets does
+    menus = data_load()
+    if all(menus.get(k) == v for k, v in persist.iteritems()) and \
+            list(data_load("menuSets_persist")) == persist.keys():
+        return
+
+    menus.update(persist)
+    data_save(persist.keys(), "menuSets_persist")
     data_save(menus)
 
 
@@ -71,19 +78,29 @@ def layer_editor_reset():  # re-parent layer editor to default maya channelbox
         cmds.formLayout(layer_editor_form, e=1, parent=layout_pane)
 
 
+data_cache = {}  # decoded fileInfo data by key for the open scene, so it's only decoded once
+
+
+def data_cache_clear(*args):  # scene changed, the cached data belongs to the previous scene
+    data_cache.clear()
+
+
 def data_save(_dict, key="menuSets"):  # encode data into a string to add to fileInfo (accepts only string)
     _str = pickle.dumps(_dict)
     _encode = base64.b64encode(_str)
     cmds.fileInfo(key, _encode)
+    data_cache[key] = copy.copy(_dict)
 
 
 def data_load(key="menuSets"):  # decode data from fileInfo
-    _data = cmds.fileInfo(key, q=1)
-    if _data:
-        _decoded = base64.b64decode(_data[0])
-        return pickle.loads(_decoded)
-    else:
-        return OrderedDict()
+    if key not in data_cache:
+        _data = cmds.fileInfo(key, q=1)
+        if _data:
+            _decoded = base64.b64decode(_data[0])
+            data_cache[key] = pickle.loads(_decoded)
+        else:
+            return OrderedDict()
+    return copy.copy(data_cache[key])  # a copy, callers modify what they're given before saving it
 
 
 def currentset_get():  # the menu set that is currently in use
@@ -241,42 +258,15 @@ def menuset_edit(_box_ui, key, menu, *args):  # interface for editing menu sets
             else:
                 cmds.textField(tf, e=1, text=_f)
 
-    def index_check(_key, _btn_up, _btn_dn):
-        _data = data_load()
-        max_index = len(_data.keys()) - 1
-        index = _data.keys().index(_key)
+    def index_check(index, count, _btn_up, _btn_dn):
         cmds.button(_btn_up, e=1, en=index != 0)
-        cmds.button(_btn_dn, e=1, en=index != max_index)
-
-    def button_up(_key, _btn_up, _btn_dn, *args):  # get current index + item at current +1 and swap them around
-        _data = data_load()
-        index = _data.keys().index(_key)
-        data_orig = _data.items()[index]
-        data_affect = _data.items()[index - 1]
+        cmds.button(_btn_dn, e=1, en=index != count - 1)
 
-        d1 = OrderedDict(_data.items()[:index - 1])
-        d1[data_orig[0]] = data_orig[1]
-        d1[data_affect[0]] = data_affect[1]
-
-        d1.update(OrderedDict(_data.items()[index + 1:]))
-        data_save(d1)
-
-        index_check(_key, _btn_up, _btn_dn)
+    def button_up(_key, _btn_up, _btn_dn, *args):
+        index_check(menuset_move(_key, -1), len(data_load()), _btn_up, _btn_dn)
 
     def button_down(_key, _btn_up, _btn_dn, *args):
-        _data = data_load()
-        index = _data.keys().index(_key)
-        data_orig = _data.items()[index]
-        data_affect = _data.items()[index + 1]
-
-        d1 = OrderedDict(_data.items()[:index])
-        d1[data_affect[0]] = data_affect[1]
-        d1[data_orig[0]] = data_orig[1]
-
-        d1.update(OrderedDict(_data.items()[index + 1:]))
-        data_save(d1)
-
-        index_check(_key, _btn_up, _btn_dn)
+        index_check(menuset_move(_key, 1), len(data_load()), _btn_up, _btn_dn)
 
     if cmds.window("jtChannelBox_UI_MenuAddEdit", exists=1):
         cmds.deleteUI("jtChannelBox_UI_MenuAddEdit")
@@ -312,7 +302,7 @@ def menuset_edit(_box_ui, key, menu, *args):  # interface for editing menu sets
                            p=layout_buttons)
     cmds.button(l="Delete", en=b_enable, w=80, c=partial(button_delete), p=layout_buttons)
 
-    index_check(key, btn_up, btn_dn)  # ensure the up or down buttons are in correct enable state
+    index_check(data.keys().index(key), len(data), btn_up, btn_dn)  # ensure the up or down buttons are correct
 
     if not b_enable:  # notify users that the menu set they are attempting to edit is persistent
         print "Modifications to persistent sets must be made in this file : " + __file__ + "\n"
@@ -324,6 +314,20 @@ def menuset_edit(_box_ui, key, menu, *args):  # interface for editing menu sets
     cmds.window(window, e=1, wh=(1, 1), rtf=1)
 
 
+def menuset_move(key, steps):
+    # move a menu set by any number of places, negative is up, positive is down, written once however far it moves
+    # returns the new index of the menu set
+    items = data_load().items()
+    index = [k for k, v in items].index(key)
+    new_index = max(0, min(len(items) - 1, index + steps))
+
+    if new_index != index:
+        items.insert(new_index, items.pop(index))
+        data_save(OrderedDict(items))
+
+    return new_index
+
+
 def menuset_sel(box_ui, key, m_item, menu, *args):
     state = cmds.menuItem(m_item, q=1, isOptionBox=1)
     if state:  # option box used, edit menu set
@@ -335,6 +339,16 @@ def menuset_sel(box_ui, key, m_item, menu, *args):
         currentset_set(key)
 
 
+def menuset_reload(box_ui, menu, *args):  # rebuild the current menu set after reloading its modules
+    CBox.channelbox_menu_hot_reload()
+    key = currentset_get()
+    data = data_load()
+    if key in data:
+        channelbox_make(box_ui, data[key])
+    else:
+        menuset_first_sel(box_ui, menu)
+
+
 def menuset_first_sel(box_ui, menu):  # change current menu set to the first available
     data = data_load()
     key = None
@@ -401,6 +415,9 @@ class ChannelBoxUI(object):
             if cmds.menu(_menu, q=1, numberOfItems=1) >= 1:
                 cmds.menuItem(divider=1, p=_menu)
             cmds.menuItem(label="Add Menu Set...", c=partial(menuset_add, self, _menu), p=_menu)
+            cmds.menuItem(label="Reload Menu Modules", c=partial(menuset_reload, self, _menu), p=_menu,
+                          annotation="Developer use : rebuild the channel box with changes made to menu and command "
+                                     "modules")
 
         with Sc.Undo(0):  # prevent UI generation being placed in undo queue
             if cmds.dockControl("jtChannelBox_UI_Dock", exists=1):
@@ -413,6 +430,11 @@ class ChannelBoxUI(object):
 
             self.window = cmds.window("jtChannelBox_UI_Window", title="Channel Box", w=100, retain=0)
 
+            # the scene may have changed while there was no window to clear the cache
+            data_cache_clear()
+            for event in ["SceneOpened", "NewSceneOpened"]:
+                cmds.scriptJob(event=(event, data_cache_clear), parent=self.window)
+
             # layouts
             self.layout_pane = cmds.paneLayout(configuration="horizontal2", paneSize=(1, 100, 75), p=self.window)
             self.layout_cbox = cmds.formLayout(p=self.layout_pane)
@@ -0,0 +1,225 @@
+# jtChannelBox - Modular / Customizeable Channel Box
+# Copyright (C) 2016 Jared Taylor
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------------#
+
+# FILTER TREE TESTS : run outside maya against a stand-in maya.cmds, whose itemFilterAttr keeps its nodes in a dict
+#   and names them the way maya does (lowest free number)
+# USAGE: python -m unittest discover tests     (python 2.7, the same as maya)
+
+import itertools
+import math
+import os
+import sys
+import types
+import unittest
+from collections import OrderedDict
+
+if sys.version_info[0] > 2:  # the scripts are python 2, the same as maya
+    raise unittest.SkipTest("jtChannelBox needs python 2")
+
+scene = {}  # itemFilterAttr node name : flags it was created with
+created = []  # every node created, in order
+
+
+def item_filter_attr(**kwargs):
+    i = 1
+    while "itemFilterAttr" + str(i) in scene:
+        i += 1
+    node = "itemFilterAttr" + str(i)
+    scene[node] = kwargs
+    created.append(node)
+    return node
+
+
+def error(message, *args, **kwargs):
+    raise RuntimeError(message)
+
+
+def delete(*nodes, **kwargs):
+    for node in nodes:
+        del scene[node]
+
+
+def nothing(*args, **kwargs):
+    return None
+
+
+maya = types.ModuleType("maya")
+cmds = types.ModuleType("maya.cmds")
+cmds.itemFilterAttr = item_filter_attr
+cmds.objExists = lambda node: node in scene
+cmds.delete = delete
+cmds.error = error
+cmds.channelBox = nothing
+cmds.undoInfo = nothing
+cmds.listAttr = nothing
+mel = types.ModuleType("maya.mel")
+mel.eval = nothing
+maya.cmds = cmds
+maya.mel = mel
+sys.modules.update({"maya": maya, "maya.cmds": cmds, "maya.mel": mel})  # no maya.api, so the cmds fallbacks are used
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import jtChannelBox_Commands_Default as cmdDef
+
+
+def make_box():
+    box = types.ModuleType("box")  # any object that takes attributes
+    box.channelbox = "channelBox1"
+    box.filter = None
+    box.filter_items = []
+    box.filter_attrs = {}
+    box.filter_nodes = OrderedDict()
+    box.saved_states = {"invertShown": [0, 0]}
+    return box
+
+
+def depth(node):
+    flags = scene[node]
+    for operation in ["union", "intersect"]:
+        if operation in flags:
+            return 1 + max([depth(child) for child in flags[operation]])
+    return 0
+
+
+def describe(node):  # the tree under a node with node names left out, to compare trees built by different boxes
+    flags = scene[node]
+    for operation in ["union", "intersect"]:
+        if operation in flags:
+            return (operation, flags["negate"]) + tuple([describe(child) for child in flags[operation]])
+    return tuple(sorted([(flag, tuple(value) if isinstance(value, list) else value) for flag, value in flags.items()]))
+
+
+def leaves(count):
+    return [("byNameString", ("attr" + str(i),)) for i in range(count)]
+
+
+class FilterTreeTest(unittest.TestCase):
+    def setUp(self):
+        scene.clear()
+        del created[:]
+        self.cache_size = cmdDef.filter_cache_size
+
+    def tearDown(self):
+        cmdDef.filter_cache_size = self.cache_size
+
+    def test_depth_is_logarithmic(self):
+        for count in range(1, 33):
+            root = cmdDef.channelBox_FilterTree(make_box(), leaves(count))
+            self.assertEqual(depth(root), int(math.ceil(math.log(count, 2))))
+
+    def test_every_filter_is_in_the_tree(self):
+        root = cmdDef.channelBox_FilterTree(make_box(), leaves(7))
+        found = []
+        pending = [root]
+        while pending:
+            flags = scene[pending.pop()]
+            if "union" in flags:
+                pending.extend(flags["union"])
+            else:
+                found.append(flags["byNameString"])
+        self.assertEqual(sorted(found), sorted([list(value) for flag, value in leaves(7)]))
+
+    def test_same_tree_for_any_toggle_order(self):
+        keys = ["attr_animCurve", "attr_expression", "attr_drivenKey", "attr_translate"]
+        trees = set()
+        for order in itertools.permutations(keys):
+            box = make_box()
+            for key in order:
+                box.filter_items.append(key)
+                cmdDef.channelBox_Filter_Items(box)
+            trees.add(describe(box.filter))
+        self.assertEqual(len(trees), 1)
+
+    def test_nodes_are_reused_across_toggles(self):
+        box = make_box()
+        box.filter_items = ["attr_animCurve", "attr_expression"]
+        cmdDef.channelBox_Filter_Items(box)
+        first = box.filter
+
+        box.filter_items.append("attr_drivenKey")
+        cmdDef.channelBox_Filter_Items(box)
+        count = len(created)
+
+        box.filter_items.remove("attr_drivenKey")
+        cmdDef.channelBox_Filter_Items(box)
+        self.assertEqual(box.filter, first)
+        box.filter_items.append("attr_drivenKey")
+        cmdDef.channelBox_Filter_Items(box)
+        self.assertEqual(len(created), count)  # toggling off and on again created nothing
+
+    def test_negate_only_on_the_root(self):
+        box = make_box()
+        plain = cmdDef.channelBox_FilterTree(box, leaves(4))
+        negated = cmdDef.channelBox_FilterTree(box, leaves(4), 1)
+        self.assertNotEqual(plain, negated)
+        self.assertEqual(scene[negated]["negate"], 1)
+        self.assertEqual(scene[negated]["union"], scene[plain]["union"])  # the halves below are shared
+
+    def test_any_and_all_nesting(self):
+        rotates = ("byNameString", ("rotateX", "rotateY", "rotateZ"))
+        nested = ("all", [("hasCurve", 1), ("any", [rotates, ("hasExpression", 1)])])
+        root = cmdDef.channelBox_FilterTree(make_box(), [nested])
+        # definitions are sorted, so the "any" comes before "hasCurve"
+        self.assertEqual(describe(root), ("intersect", 0,
+                                          ("union", 0,
+                                           (("byNameString", ("rotateX", "rotateY", "rotateZ")), ("negate", 0)),
+                                           (("hasExpression", 1), ("negate", 0))),
+                                          (("hasCurve", 1), ("negate", 0))))
+
+    def test_intersection_is_balanced(self):
+        root = cmdDef.channelBox_FilterTree(make_box(), [("all", leaves(8))])
+        self.assertEqual(depth(root), 3)
+        self.assertTrue("intersect" in scene[root])
+
+    def test_empty_definition_is_an_error(self):
+        self.assertRaises(RuntimeError, cmdDef.channelBox_FilterTree, make_box(), [])
+
+    def test_collect_keeps_the_active_tree(self):
+        cmdDef.filter_cache_size = 4
+        box = make_box()
+        for count in range(2, 12):
+            box.filter = cmdDef.channelBox_FilterTree(box, leaves(count)[::-1])
+            cmdDef.channelBox_FilterCollect(box)
+
+            pending = [box.filter]
+            while pending:
+                node = pending.pop()
+                self.assertTrue(node in scene)
+                self.assertTrue(node in box.filter_nodes.values())
+                pending.extend(scene[node].get("union", ()))
+
+            for node in box.filter_nodes.values():  # nothing cached refers to a deleted node
+                self.assertTrue(node in scene)
+                for child in scene[node].get("union", ()):
+                    self.assertTrue(child in scene)
+
+    def test_close_deletes_cached_nodes(self):
+        box = make_box()
+        box.state_persist = 0
+        box.state_dirty = 0
+        box.filter = item_filter_attr()
+        box.filter_nodes[("default", 0)] = box.filter
+        box.filter_items = ["attr_animCurve", "attr_expression"]
+        cmdDef.channelBox_Filter_Items(box)
+        other = item_filter_attr()  # not this channel box's
+
+        cmdDef.sysCmd.channelbox_close(box)
+        self.assertEqual(scene.keys(), [other])
+        self.assertEqual(len(box.filter_nodes), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()